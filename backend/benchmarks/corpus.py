@@ -0,0 +1,98 @@
+# benchmarks/corpus.py
+"""
+Synthetic PDF corpus for the benchmarks, built with fitz so nothing is checked in.
+Documents are deterministic for a given seed.
+"""
+import random
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+VOCABULARY = """
+photosynthesis chlorophyll energy light reaction glucose carbon dioxide oxygen plant cell membrane
+enzyme protein structure function mitochondria respiration metabolism gradient transport diffusion
+equation derivative integral function limit matrix vector eigenvalue probability distribution variance
+economics market supply demand price elasticity equilibrium policy inflation interest capital labour
+history empire revolution treaty trade colony industry reform parliament constitution democracy
+algorithm complexity graph network memory compiler language runtime processor cache thread process
+""".split()
+
+BOILERPLATE = [
+    "Department of Natural Sciences - Lecture Notes - Confidential Draft",
+    "Copyright (c) University Press. All rights reserved. Do not distribute.",
+    "Scanned by CamScanner",
+]
+
+# name -> (pages, kind)
+CORPUS: Dict[str, Tuple[int, str]] = {
+    "text-1p": (1, "text"),
+    "text-10p": (10, "text"),
+    "text-50p": (50, "text"),
+    "text-200p": (200, "text"),
+    "scanned-20p": (20, "image"),
+    "boilerplate-30p": (30, "boilerplate"),
+    "mixed-40p": (40, "mixed"),
+}
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(VOCABULARY, k=rng.randint(8, 22))
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _image_page(doc: "fitz.Document", rng: random.Random):
+    """A page holding only a noisy raster image, like a phone scan with no OCR layer."""
+    page = doc.new_page()
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 260), False)
+    pix.set_rect(pix.irect, (235, 235, 230))
+    for _ in range(400):
+        x, y = rng.randrange(200), rng.randrange(260)
+        pix.set_pixel(x, y, (40, 40, 40))
+    page.insert_image(page.rect, pixmap=pix)
+
+
+def _text_page(doc: "fitz.Document", rng: random.Random, boilerplate: bool):
+    page = doc.new_page()
+    body = fitz.Rect(50, 60, page.rect.width - 50, page.rect.height - 60)
+    if boilerplate:
+        # Heavy header/footer/watermark noise on every page around a short body
+        for i, line in enumerate(BOILERPLATE):
+            page.insert_text((50, 20 + 12 * i), line, fontsize=8)
+            page.insert_text((50, page.rect.height - 40 + 12 * i), line, fontsize=8)
+        text = _paragraph(rng, 4)
+    else:
+        text = "\n\n".join(_paragraph(rng, 6) for _ in range(4))
+    page.insert_textbox(body, text, fontsize=9)
+
+
+def make_pdf(pages: int, kind: str, seed: int = 0) -> bytes:
+    """Build one PDF. kind is "text", "image", "boilerplate" or "mixed"."""
+    rng = random.Random(f"{kind}-{pages}-{seed}")
+    doc = fitz.open()
+    for i in range(pages):
+        if kind == "image" or (kind == "mixed" and i % 4 == 3):
+            _image_page(doc, rng)
+        else:
+            _text_page(doc, rng, boilerplate=(kind == "boilerplate"))
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def build_corpus(names: List[str] = None, seed: int = 0) -> Dict[str, bytes]:
+    return {name: make_pdf(*CORPUS[name], seed=seed) for name in (names or CORPUS)}
+
+
+def make_text(words: int, seed: int = 0) -> str:
+    """Plain text of roughly `words` words, for the chunking and keyword benchmarks."""
+    rng = random.Random(f"text-{words}-{seed}")
+    parts, count = [], 0
+    while count < words:
+        sentence = _sentence(rng)
+        parts.append(sentence)
+        count += len(sentence.split())
+    return " ".join(parts)
@@ -0,0 +1,102 @@
+# benchmarks/fakes.py
+"""
+In-process stand-ins for the LLM providers and the YouTube search API.
+They are patched in at the module boundaries (the llm provider registry
+and youtube_utils' httpx.get), so the fallback chain, output
+validation and video parsing still run for real.
+"""
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from benchmarks.corpus import VOCABULARY
+
+PROVIDER_NAMES = ["Gemini", "Gemini2", "Gemini3", "Gemini4", "Fireworks", "Groq"]
+
+
+class FakeLLM:
+    """
+    Async provider with configurable latency and failure modes.
+    failure_rate -> raises, timeout_rate -> raises asyncio.TimeoutError,
+    invalid_rate -> returns text the fallback rejects as invalid output.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, failure_rate: float = 0.0,
+                 timeout_rate: float = 0.0, invalid_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.invalid_rate = invalid_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    async def __call__(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+        roll = self.rng.random()
+        if roll < self.failure_rate:
+            raise RuntimeError("fake provider error")
+        roll -= self.failure_rate
+        if roll < self.timeout_rate:
+            raise asyncio.TimeoutError()
+        roll -= self.timeout_rate
+        if roll < self.invalid_rate:
+            return "Please generate a clear and concise summary."
+        words = self.rng.choices(VOCABULARY, k=min(400, max(40, len(prompt.split()) // 5)))
+        return ". ".join(" ".join(words[i:i + 12]).capitalize() for i in range(0, len(words), 12)) + "."
+
+
+class FakeYouTubeResponse:
+    def __init__(self, payload: Dict):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> Dict:
+        return self._payload
+
+
+class FakeYouTube:
+    """Replacement for httpx.get used by youtube_utils (it runs in a worker thread, so it blocks)."""
+
+    def __init__(self, latency: float = 0.1, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def __call__(self, url: str, params: Dict = None, timeout: float = None) -> FakeYouTubeResponse:
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.rng.random() < self.failure_rate:
+            raise RuntimeError("fake YouTube error")
+        query = (params or {}).get("q", "")
+        return FakeYouTubeResponse({"items": [_video(query, i) for i in range(6)]})
+
+
+def _video(query: str, i: int) -> Dict:
+    video_id = f"vid{abs(hash((query, i))) % 10**8:08d}"
+    return {
+        "id": {"videoId": video_id},
+        "snippet": {
+            "title": f"{query} #{i}",
+            "channelTitle": "Fake Channel",
+            "publishedAt": "2024-01-01T00:00:00Z",
+            "thumbnails": {"high": {"url": f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"}},
+        },
+    }
+
+
+def install_fakes(llm: List[FakeLLM], youtube: FakeYouTube):
+    """Patch the fakes into the already-imported app modules."""
+    from llm.registry import PROVIDERS
+    from utils import youtube_utils
+
+    fakes = dict(zip(PROVIDER_NAMES, llm))
+    for provider in PROVIDERS:
+        provider.override(fakes[provider.name])
+    youtube_utils.httpx = SimpleNamespace(get=youtube)
@@ -0,0 +1,69 @@
+# benchmarks/importtime.py
+"""
+Cold-start import cost of the app, measured with `python -X importtime`.
+
+    cd backend
+    python -m benchmarks.importtime          # median of 5 fresh interpreters + heaviest imports
+
+benchmarks/run.py includes this as the "import/main" benchmark and fails if
+any of HEAVY_MODULES gets imported eagerly again.
+"""
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# SDKs that must only load on first use (or in the background warm-up)
+HEAVY_MODULES = ["google.generativeai", "groq", "openai", "fitz", "pdfplumber", "supabase"]
+
+
+def import_once(module: str = "main") -> Tuple[float, Dict[str, int]]:
+    """Import `module` in a fresh interpreter. Returns (seconds, {imported module: cumulative us})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative[parts[2].strip()] = int(parts[1])
+    return cumulative.get(module, 0) / 1e6, cumulative
+
+
+def measure_import(module: str = "main", runs: int = 5) -> Tuple[List[float], List[str], Dict[str, int]]:
+    """Samples in seconds, heavy modules that were imported eagerly, and the last run's breakdown."""
+    samples, breakdown = [], {}
+    for _ in range(runs):
+        seconds, breakdown = import_once(module)
+        samples.append(seconds)
+    eager = [m for m in HEAVY_MODULES if m in breakdown]
+    return samples, eager, breakdown
+
+
+def main():
+    samples, eager, breakdown = measure_import()
+    print(f"import main: median {statistics.median(samples) * 1000:.1f} ms over {len(samples)} runs")
+    print("Heaviest imports (cumulative):")
+    top_level = {name: us for name, us in breakdown.items() if "." not in name}
+    for name, us in sorted(top_level.items(), key=lambda x: x[1], reverse=True)[:15]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    if eager:
+        print(f"❌ Imported eagerly at startup: {', '.join(eager)}")
+        return 1
+    print("✅ No heavy SDKs imported at startup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
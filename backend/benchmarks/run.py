@@ -0,0 +1,362 @@
+# benchmarks/run.py
+"""
+Offline performance benchmarks. No network, no API keys.
+
+    cd backend
+    python -m benchmarks.run                    # run and compare against benchmarks/baseline.json (required)
+
+Timings are machine-specific, so no baseline ships with the repo: record one with
+--update-baseline on the machine / CI runner that enforces the gate (and commit or
+cache it) before the first comparison run. Without one, the run fails on purpose.
+    python -m benchmarks.run --update-baseline  # record a new baseline on this machine
+    python -m benchmarks.run --quick            # smaller corpus for a fast check
+
+Exits with status 1 when a benchmark regresses past --tolerance, or when the
+bounded pipeline's peak heap for a large PDF exceeds --memory-budget-mb.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+# The app reads these at import time; the fakes replace everything that would use them
+os.environ.setdefault("YOUTUBE_API_KEY", "benchmark")
+os.environ.setdefault("QUOTA_BACKEND", "memory")
+
+from benchmarks.corpus import CORPUS, build_corpus, make_pdf, make_text  # noqa: E402
+from benchmarks.fakes import FakeLLM, FakeYouTube, PROVIDER_NAMES, install_fakes  # noqa: E402
+from benchmarks.importtime import measure_import  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+QUICK_CORPUS = ["text-1p", "text-10p", "scanned-20p", "boilerplate-30p"]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Process-wide RSS high-water mark since startup (printed once at the end, not compared)."""
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _proc_status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024  # kB
+    except OSError:
+        pass
+    return None
+
+
+_rss_start: Optional[float] = None
+
+
+def start_rss_window():
+    """
+    Begin measuring one benchmark's own RSS growth. ru_maxrss only ever grows, so instead
+    reset the kernel's high-water mark (VmHWM, Linux) and remember where RSS started.
+    """
+    global _rss_start
+    _rss_start = None
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return
+    _rss_start = _proc_status_mb("VmRSS")
+
+
+def rss_growth_mb() -> Optional[float]:
+    """Peak RSS during the current benchmark minus RSS when it started; None where unsupported."""
+    peak = _proc_status_mb("VmHWM")
+    if _rss_start is None or peak is None:
+        return None
+    return round(max(0.0, peak - _rss_start), 1)
+
+
+def report(samples: List[float], wall: float, **extra) -> Dict:
+    return {
+        "n": len(samples),
+        "throughput": round(len(samples) / wall, 3) if wall else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "rss_growth_mb": rss_growth_mb(),
+        **extra,
+    }
+
+
+def bench_sync(fn: Callable[[], object], iterations: int) -> Dict:
+    start_rss_window()
+    samples = []
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return report(samples, time.perf_counter() - wall_start)
+
+
+async def bench_upload(docs: Dict[str, bytes], total: int, concurrency: int) -> Dict:
+    import httpx
+    import main
+
+    start_rss_window()
+    # Benchmarks hammer the route from one address; lift the per-IP limits
+    main.limiter.enabled = False
+    main.UPLOAD_QUOTA_LIMIT = 10 ** 9
+
+    names = list(docs)
+    samples: List[float] = []
+    statuses: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client: "httpx.AsyncClient", i: int):
+        name = names[i % len(names)]
+        # Trailing comment after %%EOF keeps the PDF valid but makes every upload
+        # distinct, so the run measures the pipeline rather than request coalescing
+        content = docs[name] + f"\n%bench-{i}\n".encode()
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/upload-pdf", files={"file": (f"{name}.pdf", content, "application/pdf")})
+            samples.append(time.perf_counter() - start)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(total)))
+        wall = time.perf_counter() - wall_start
+    return report(samples, wall, statuses=statuses)
+
+
+async def bench_write_behind(rows: int, error_rate: float) -> Dict:
+    """
+    Enqueue rows into the Supabase write-behind queue against the in-process REST stand-in
+    (loadtest/stub_server.py) with injected 503s, repeated keys and a small buffer, then check every row landed.
+    """
+    import httpx
+    from loadtest import stub_server
+    from utils.write_behind import WriteBehindQueue
+
+    start_rss_window()
+    stub_server.tables.clear()
+    stub_server.config.update(supabase_latency="fixed:0.005", supabase_error_rate=error_rate)
+    with tempfile.TemporaryDirectory() as spill_dir:
+        queue = WriteBehindQueue(
+            "http://supabase.stub", "bench",
+            conflict_columns={"summaries": "id"},
+            batch_size=100, flush_interval=0.05, max_buffer=rows // 4, max_backoff=0.2,
+            spill_dir=spill_dir, transport=httpx.ASGITransport(app=stub_server.app),
+        )
+        await queue.start()
+        samples = []
+        wall_start = time.perf_counter()
+        for i in range(rows):
+            start = time.perf_counter()
+            queue.enqueue("summaries", {"id": f"doc-{i}", "filename": f"doc-{i}.pdf", "summary": "x" * 500})
+            samples.append(time.perf_counter() - start)
+            if i % 10 == 0:
+                # Same PDF uploaded again: the duplicate key usually lands in the same flush
+                queue.enqueue("summaries", {"id": f"doc-{i}", "filename": f"again-{i}.pdf", "summary": "y" * 500})
+            if i % 200 == 0:
+                await asyncio.sleep(0)  # let the flusher run, as it would between requests
+
+        deadline = time.monotonic() + 60
+        while len(stub_server.tables.get("summaries", {})) < rows and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        drain_seconds = time.perf_counter() - wall_start
+        await queue.stop()
+
+    persisted = len(stub_server.tables.get("summaries", {}))
+    return report(samples, drain_seconds, rows_expected=rows, rows_persisted=persisted,
+                  drain_seconds=round(drain_seconds, 3))
+
+
+def bench_memory(content: bytes, mode: str) -> Dict:
+    """
+    Peak Python heap while one PDF goes through the pipeline in `mode`, read from the
+    app's own request_peak_memory_bytes metric. PyMuPDF's C allocations aren't traced;
+    peak_rss_mb covers those.
+    """
+    import main
+    from utils.metrics import REQUEST_PEAK_MEMORY
+
+    main.PIPELINE_MODE = mode
+    start_rss_window()
+    labels = {"route": "/upload-pdf", "overlapped": "false"}
+    count, total = REQUEST_PEAK_MEMORY.count(**labels), REQUEST_PEAK_MEMORY.sum(**labels)
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = asyncio.run(main.process_pdf(content))
+        elapsed = time.perf_counter() - start
+    finally:
+        tracemalloc.stop()
+    if REQUEST_PEAK_MEMORY.count(**labels) != count + 1:
+        raise RuntimeError("process_pdf did not record request_peak_memory_bytes")
+    peak = REQUEST_PEAK_MEMORY.sum(**labels) - total
+    return report([elapsed], elapsed, peak_python_mb=round(peak / (1024 * 1024), 2),
+                  rejected="rejected" in result)
+
+
+def run(args) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+
+    # Measure cold import in fresh interpreters before this process imports anything heavy
+    start_rss_window()
+    samples, eager, _ = measure_import(runs=args.iterations)
+    results["import/main"] = report(samples, sum(samples), eager_heavy_imports=eager)
+    print(f"import/main: {results['import/main']}")
+
+    llm = [
+        FakeLLM(latency=args.llm_latency, failure_rate=args.llm_failure_rate, seed=i)
+        for i in range(len(PROVIDER_NAMES))
+    ]
+    install_fakes(llm, FakeYouTube(latency=args.youtube_latency, failure_rate=args.youtube_failure_rate))
+
+    from main import smart_chunk_text
+    from utils.pdf_utils import extract_text_from_pdf
+    from utils.youtube_utils import extract_keywords
+
+    docs = build_corpus(QUICK_CORPUS if args.quick else list(CORPUS))
+
+    for name, content in docs.items():
+        results[f"extract/{name}"] = bench_sync(lambda: extract_text_from_pdf(content), args.iterations)
+        print(f"extract/{name}: {results[f'extract/{name}']}")
+
+    for words in (2000, 20000, 100000):
+        text = make_text(words)
+        results[f"chunk/{words}w"] = bench_sync(lambda: smart_chunk_text(text, 3000), args.iterations)
+        print(f"chunk/{words}w: {results[f'chunk/{words}w']}")
+
+    for words in (200, 2000):
+        text = make_text(words)
+        results[f"keywords/{words}w"] = bench_sync(lambda: extract_keywords(text, k=6), args.iterations)
+        print(f"keywords/{words}w: {results[f'keywords/{words}w']}")
+
+    upload_docs = {name: docs[name] for name in docs if name in QUICK_CORPUS}
+    results["upload"] = asyncio.run(bench_upload(upload_docs, args.requests, args.concurrency))
+    print(f"upload: {results['upload']}")
+
+    results["write_behind"] = asyncio.run(bench_write_behind(2000 if args.quick else 10000, error_rate=0.2))
+    print(f"write_behind: {results['write_behind']}")
+
+    large = make_pdf(args.memory_pages, "text")
+    for mode in ("buffered", "bounded"):
+        results[f"memory/{mode}"] = bench_memory(large, mode)
+        print(f"memory/{mode}: {results[f'memory/{mode}']}")
+    print(f"process peak RSS: {peak_rss_mb():.1f} MB")
+    return results
+
+
+def memory_budget(results: Dict[str, Dict], budget_mb: float) -> List[str]:
+    """The bounded pipeline must stay under the budget and never peak above the buffered one."""
+    bounded, buffered = results.get("memory/bounded"), results.get("memory/buffered")
+    if not bounded:
+        return []
+    regressions = []
+    if bounded["peak_python_mb"] > budget_mb:
+        regressions.append(f"memory/bounded: peak heap {bounded['peak_python_mb']}MB over the {budget_mb}MB budget")
+    if buffered and bounded["peak_python_mb"] > buffered["peak_python_mb"]:
+        regressions.append(
+            f"memory/bounded: peak heap {bounded['peak_python_mb']}MB above buffered ({buffered['peak_python_mb']}MB)"
+        )
+    return regressions
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regressions: p95 or a benchmark's own RSS growth up, or throughput down, by more than `tolerance`;
+    eager SDK imports; lost write-behind rows."""
+    regressions = [
+        f"{name}: imported eagerly at startup: {', '.join(current['eager_heavy_imports'])}"
+        for name, current in results.items() if current.get("eager_heavy_imports")
+    ] + [
+        f"{name}: only {current['rows_persisted']}/{current['rows_expected']} rows persisted"
+        for name, current in results.items() if current.get("rows_persisted", 0) < current.get("rows_expected", 0)
+    ]
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        # Small absolute slack so sub-millisecond benchmarks don't flap
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) + 0.5:
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput']}/s -> {current['throughput']}/s")
+        if base.get("rss_growth_mb") is not None and current.get("rss_growth_mb") is not None:
+            if current["rss_growth_mb"] > base["rss_growth_mb"] * (1 + tolerance) + 5:
+                regressions.append(f"{name}: RSS growth {base['rss_growth_mb']}MB -> {current['rss_growth_mb']}MB")
+        if "peak_python_mb" in base and current["peak_python_mb"] > base["peak_python_mb"] * (1 + tolerance) + 1:
+            regressions.append(f"{name}: peak heap {base['peak_python_mb']}MB -> {current['peak_python_mb']}MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline PDF pipeline benchmarks")
+    parser.add_argument("--quick", action="store_true", help="small corpus for a fast check")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=40, help="uploads sent in the route benchmark")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.1)
+    parser.add_argument("--youtube-latency", type=float, default=0.05)
+    parser.add_argument("--youtube-failure-rate", type=float, default=0.0)
+    parser.add_argument("--memory-pages", type=int, default=500, help="pages in the PDF for the memory benchmarks")
+    # Bounded mode holds PIPELINE_WINDOW chunks and their prompts plus the chunk summaries for the
+    # reduce step (~1 MB for the 500-page PDF); buffering the whole text costs ~16 MB
+    parser.add_argument("--memory-budget-mb", type=float, default=4.0,
+                        help="max peak Python heap for one large PDF in bounded mode")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="also write results as JSON here")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    # The memory budget is absolute, so it's enforced with or without a baseline
+    regressions = memory_budget(results, args.memory_budget_mb)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"📌 Baseline written to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        # A missing baseline must not turn the gate into a silent pass
+        regressions.append(f"no baseline at {args.baseline}; record one with --update-baseline on the reference machine")
+    else:
+        with open(args.baseline) as f:
+            regressions += compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("❌ Regressions:")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,9 @@
 # llm/fallback.py
-from .gemini import summarize_with_gemini
-from .gemini2 import summarize_with_gemini2
-from .gemini3 import summarize_with_gemini3
-from .gemini4 import summarize_with_gemini4
-from .fireworks import summarize_with_fireworks
-from .groq import summarize_with_groq
+from .registry import configured_providers
+from utils.metrics import PROVIDER_LATENCY, TOKENS_PROCESSED, estimate_tokens
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -36,31 +34,42 @@ Text to summarize:
 {text.strip()}
 """
 
-async def generate_summary(text: str) -> str:
+async def generate_summary(text: str, wrap: bool = True) -> str:
+    """
+    Run text through the provider fallback chain.
+    wrap=False sends `text` as the prompt as-is, for callers that built their own
+    (otherwise it gets wrapped in a second set of instructions and copied again).
+    """
     if not text or len(text.strip()) < 10:
         return "No content to summarize."
 
-    prompt = get_summary_prompt(text)
+    prompt = get_summary_prompt(text) if wrap else text
 
-    providers = [
-        ("Gemini", lambda: summarize_with_gemini(prompt)),
-        ("Gemini2", lambda: summarize_with_gemini2(prompt)),
-        ("Gemini3", lambda: summarize_with_gemini3(prompt)),
-        ("Gemini4", lambda: summarize_with_gemini4(prompt)),
-        ("Fireworks", lambda: summarize_with_fireworks(prompt)),
-        ("Groq", lambda: summarize_with_groq(prompt)),
-    ]
-
-    for name, provider in providers:
+    # Providers without an API key are skipped without importing their SDK
+    for provider in configured_providers():
+        name = provider.name
+        start = time.perf_counter()
+        outcome = "error"
         try:
             logger.info(f"Trying {name}...")
-            result = await provider()
+            TOKENS_PROCESSED.inc(estimate_tokens(prompt), direction="prompt")
+            result = await provider(prompt)
             if result and not is_invalid_output(result):
+                outcome = "success"
+                TOKENS_PROCESSED.inc(estimate_tokens(result), direction="completion")
                 logger.info(f"✅ Success with {name}")
                 return result.strip()
+            if result:
+                outcome = "invalid_output"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            logger.error(f"❌ {name} timed out")
+            continue
         except Exception as e:
             logger.error(f"❌ {name} failed: {e}")
             continue
+        finally:
+            PROVIDER_LATENCY.observe(time.perf_counter() - start, provider=name, outcome=outcome)
 
     # ✅ Only return this if all providers failed
     return "Summary could not be generated. Please try again later."
\ No newline at end of file
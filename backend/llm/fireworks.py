@@ -1,5 +1,6 @@
 # llm/fireworks.py
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APITimeoutError
+import asyncio
 import os
 from dotenv import load_dotenv
 import logging
@@ -14,7 +15,7 @@ if not api_key:
 
 # Use Fireworks with OpenAI client + 60s timeout
 client = AsyncOpenAI(
-    base_url="https://api.fireworks.ai/inference/v1",  # ✅ Fixed: removed trailing space
+    base_url=os.getenv("FIREWORKS_BASE_URL", "https://api.fireworks.ai/inference/v1"),
     api_key=api_key,
     timeout=60.0  # ✅ 60-second timeout for all requests
 ) if api_key else None
@@ -39,6 +40,9 @@ async def summarize_with_fireworks(prompt: str, model: str = "accounts/fireworks
             top_p=0.9
         )
         return response.choices[0].message.content.strip()
+    except APITimeoutError as e:
+        logger.warning("Fireworks request timed out")
+        raise asyncio.TimeoutError() from e
     except Exception as e:
         logger.error(f"Fireworks error: {e}")
         return None
\ No newline at end of file
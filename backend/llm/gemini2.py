@@ -4,13 +4,18 @@ import os
 from dotenv import load_dotenv
 import asyncio
 import logging
+from utils.metrics import run_in_thread
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 api_key = os.getenv("GEMINI_API_KEY2")
-if api_key:
+# Optional endpoint override (e.g. the local stub in loadtest/stub_server.py)
+api_endpoint = os.getenv("GEMINI_API_ENDPOINT")
+if api_key and api_endpoint:
+    genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": api_endpoint})
+elif api_key:
     genai.configure(api_key=api_key)
 else:
     logger.warning("GEMINI_API_KEY not set")
@@ -28,15 +33,14 @@ async def summarize_with_gemini2(prompt: str) -> str:
     if not api_key:
         return None
     try:
-        loop = asyncio.get_event_loop()
         result = await asyncio.wait_for(
-            loop.run_in_executor(None, _sync_summarize, prompt),
+            run_in_thread("gemini", _sync_summarize, prompt),
             timeout=60.0
         )
         return result
     except asyncio.TimeoutError:
         logger.warning("Gemini request timed out after 60 seconds")
-        return None
+        raise
     except Exception as e:
         logger.error(f"Gemini async error: {e}")
         return None
\ No newline at end of file
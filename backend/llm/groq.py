@@ -1,5 +1,6 @@
 # llm/groq.py
-from groq import AsyncGroq
+from groq import AsyncGroq, APITimeoutError
+import asyncio
 import os
 from dotenv import load_dotenv
 import logging
@@ -12,7 +13,8 @@ api_key = os.getenv("GROQ_API_KEY")
 if not api_key:
     logger.warning("GROQ_API_KEY not set")
 
-client = AsyncGroq(api_key=api_key, timeout=60.0) if api_key else None
+# GROQ_BASE_URL points the client elsewhere (e.g. the local stub); None keeps the default
+client = AsyncGroq(api_key=api_key, base_url=os.getenv("GROQ_BASE_URL"), timeout=60.0) if api_key else None
 
 async def summarize_with_groq(prompt: str) -> str:
     if not client:
@@ -25,6 +27,9 @@ async def summarize_with_groq(prompt: str) -> str:
             temperature=0.7
         )
         return chat_completion.choices[0].message.content.strip()
+    except APITimeoutError as e:
+        logger.warning("Groq request timed out")
+        raise asyncio.TimeoutError() from e
     except Exception as e:
         logger.error(f"Groq error: {e}")
         return None
\ No newline at end of file
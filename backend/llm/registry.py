@@ -0,0 +1,64 @@
+# llm/registry.py
+import importlib
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Provider:
+    """
+    One LLM provider in the fallback chain, loaded on first use.
+    The provider module (and its SDK: google.generativeai, groq, openai) is only
+    imported when the provider is first called or warmed, and only if its key is set.
+    """
+
+    def __init__(self, name: str, key_env: str, module: str, function: str):
+        self.name = name
+        self.key_env = key_env
+        self.module = module
+        self.function = function
+        self._fn: Optional[Callable[[str], Awaitable[str]]] = None
+
+    @property
+    def configured(self) -> bool:
+        return self._fn is not None or bool(os.getenv(self.key_env))
+
+    def load(self) -> Callable[[str], Awaitable[str]]:
+        if self._fn is None:
+            module = importlib.import_module(f".{self.module}", __package__)
+            self._fn = getattr(module, self.function)
+        return self._fn
+
+    def override(self, fn: Callable[[str], Awaitable[str]]):
+        """Swap in another implementation (benchmarks, tests)."""
+        self._fn = fn
+
+    async def __call__(self, prompt: str) -> str:
+        return await self.load()(prompt)
+
+
+# Order is the fallback order
+PROVIDERS: List[Provider] = [
+    Provider("Gemini", "GEMINI_API_KEY", "gemini", "summarize_with_gemini"),
+    Provider("Gemini2", "GEMINI_API_KEY2", "gemini2", "summarize_with_gemini2"),
+    Provider("Gemini3", "GEMINI_API_KEY3", "gemini3", "summarize_with_gemini3"),
+    Provider("Gemini4", "GEMINI_API_KEY4", "gemini4", "summarize_with_gemini4"),
+    Provider("Fireworks", "FIREWORKS_API_KEY", "fireworks", "summarize_with_fireworks"),
+    Provider("Groq", "GROQ_API_KEY", "groq", "summarize_with_groq"),
+]
+
+
+def configured_providers() -> List[Provider]:
+    return [p for p in PROVIDERS if p.configured]
+
+
+def warm_providers():
+    """Import and build every configured provider now (called off the event loop at startup)."""
+    for provider in configured_providers():
+        try:
+            provider.load()
+        except Exception as e:
+            logger.error(f"❌ Warming {provider.name} failed: {e}")
+    logger.info(f"🔥 Warmed {len(configured_providers())} LLM providers")
@@ -0,0 +1,187 @@
+# loadtest/load.py
+"""
+Concurrency load test for the real app against the provider stub.
+
+For each worker count it starts the stub and `uvicorn main:app --workers N`,
+then ramps the number of concurrent uploaders step by step and reports
+throughput, latency and errors per step, plus the saturation point: the
+first step where adding clients stops buying throughput or p95 blows up.
+
+    cd backend
+    python -m loadtest.load --workers 1,2,4 --steps 1,2,4,8,16,32 --step-seconds 20
+
+Extra STUB_* variables in the environment are passed to the stub
+(see loadtest/stub_server.py), e.g. STUB_LLM_LATENCY=lognormal:-0.7,0.5.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.corpus import make_pdf
+from benchmarks.run import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def backend_env(stub_url: str, workers: int, quota_db: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        # Dummy keys so every provider is configured; all traffic goes to the stub
+        "GEMINI_API_KEY": "stub", "GEMINI_API_KEY2": "stub", "GEMINI_API_KEY3": "stub",
+        "GEMINI_API_KEY4": "stub", "GROQ_API_KEY": "stub", "FIREWORKS_API_KEY": "stub",
+        "YOUTUBE_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": stub_url,
+        "FIREWORKS_BASE_URL": f"{stub_url}/v1",
+        "GROQ_BASE_URL": stub_url,
+        "YOUTUBE_BASE_URL": f"{stub_url}/youtube/v3/search",
+        # Persistence goes to the stub's /rest/v1 too; main's load_dotenv() doesn't override
+        # these, so a load run never writes synthetic rows to a real Supabase project
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_KEY": "stub",
+        # Every upload comes from 127.0.0.1
+        "RATE_LIMITS_ENABLED": "false",
+        "UPLOAD_QUOTA_LIMIT": str(10 ** 9),
+        "QUOTA_BACKEND": "sqlite" if workers > 1 else "memory",
+        # Own quota file, not the default one a real server on this box would share
+        "QUOTA_DB_PATH": quota_db,
+    })
+    return env
+
+
+def start_server(module: str, port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", module, "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+
+
+def wait_ready(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+async def run_step(base_url: str, pdf: bytes, concurrency: int, seconds: float, same_file: bool) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    deadline = time.monotonic() + seconds
+    counter = 0
+
+    async def uploader(client: httpx.AsyncClient):
+        nonlocal counter
+        while time.monotonic() < deadline:
+            counter += 1
+            # Unique bytes per request unless we're measuring coalescing
+            content = pdf if same_file else pdf + f"\n%load-{counter}\n".encode()
+            start = time.perf_counter()
+            try:
+                response = await client.post("/upload-pdf", files={"file": ("load.pdf", content, "application/pdf")})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(uploader(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    ok = statuses.get("200", 0)
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput": round(ok / wall, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "error_rate": round(1 - ok / len(latencies), 4) if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+def saturation_point(steps: List[Dict], min_gain: float, max_error_rate: float) -> Dict:
+    """First step that adds < min_gain throughput, more than doubles p95, or errors too much."""
+    for prev, step in zip(steps, steps[1:]):
+        if step["error_rate"] > max_error_rate:
+            return {"concurrency": step["concurrency"], "reason": f"error rate {step['error_rate']:.1%}"}
+        if step["throughput"] < prev["throughput"] * (1 + min_gain):
+            return {"concurrency": step["concurrency"], "reason": "throughput flattened"}
+        if step["p95_ms"] > 2 * steps[0]["p95_ms"] and step["throughput"] < prev["throughput"] * 1.5:
+            return {"concurrency": step["concurrency"], "reason": "p95 doubled"}
+    return {"concurrency": None, "reason": "not saturated in tested range"}
+
+
+def print_table(workers: int, steps: List[Dict], saturation: Dict):
+    print(f"\n=== {workers} worker(s) ===")
+    print(f"{'conc':>5} {'reqs':>6} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>7}")
+    for s in steps:
+        print(f"{s['concurrency']:>5} {s['requests']:>6} {s['throughput']:>8} {s['p50_ms']:>9} "
+              f"{s['p95_ms']:>9} {s['p99_ms']:>9} {s['error_rate']:>7.1%}")
+    print(f"Saturation: {saturation['concurrency']} ({saturation['reason']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent uploads against the app + provider stub")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated uvicorn worker counts")
+    parser.add_argument("--steps", default="1,2,4,8,16,32", help="comma-separated concurrency levels")
+    parser.add_argument("--step-seconds", type=float, default=20.0)
+    parser.add_argument("--pages", type=int, default=20, help="pages in the uploaded PDF")
+    parser.add_argument("--same-file", action="store_true", help="upload identical bytes (exercises coalescing)")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--min-gain", type=float, default=0.10, help="throughput gain that still counts as scaling")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="write all results as JSON here")
+    args = parser.parse_args()
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    base_url = f"http://127.0.0.1:{args.port}"
+    pdf = make_pdf(args.pages, "text")
+    steps = [int(s) for s in args.steps.split(",")]
+    results = {}
+
+    stub = start_server("loadtest.stub_server:app", args.stub_port, 1, dict(os.environ))
+    scratch = tempfile.TemporaryDirectory(prefix="pdepth-loadtest-")
+    try:
+        wait_ready(f"{stub_url}/_stub/stats")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            quota_db = os.path.join(scratch.name, f"quota-{workers}.sqlite3")
+            server = start_server("main:app", args.port, workers, backend_env(stub_url, workers, quota_db))
+            try:
+                wait_ready(f"{base_url}/health")
+                step_results = [
+                    asyncio.run(run_step(base_url, pdf, c, args.step_seconds, args.same_file)) for c in steps
+                ]
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            saturation = saturation_point(step_results, args.min_gain, args.max_error_rate)
+            print_table(workers, step_results, saturation)
+            results[workers] = {"steps": step_results, "saturation": saturation}
+    finally:
+        stub.terminate()
+        stub.wait(timeout=30)
+        scratch.cleanup()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# loadtest/stub_server.py
+"""
+Local stand-in for the external APIs the backend calls, for load testing.
+
+Speaks just enough of:
+- OpenAI-compatible chat completions (Fireworks, Groq)
+- Gemini REST generateContent
+- YouTube Data API v3 search
+- Supabase (PostgREST) bulk upserts, kept in memory
+
+Run it and point the backend at it:
+
+    uvicorn loadtest.stub_server:app --port 9100
+    FIREWORKS_BASE_URL=http://127.0.0.1:9100/v1
+    GROQ_BASE_URL=http://127.0.0.1:9100
+    GEMINI_API_ENDPOINT=http://127.0.0.1:9100
+    YOUTUBE_BASE_URL=http://127.0.0.1:9100/youtube/v3/search
+    SUPABASE_URL=http://127.0.0.1:9100  SUPABASE_KEY=stub
+
+Behaviour is scripted through STUB_* environment variables at startup, or
+at runtime with POST /_stub/config, e.g.
+{"llm_latency": "lognormal:-0.5,0.6", "burst_every": 30, "burst_length": 5, "echo": true}.
+"""
+import asyncio
+import math
+import os
+import random
+import time
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+VOCABULARY = """
+cells energy light glucose enzyme membrane protein equation derivative matrix probability market
+supply demand policy history empire trade reform algorithm graph network memory compiler process
+""".split()
+
+config: Dict[str, Any] = {
+    # Latency distributions: "fixed:S", "uniform:LO,HI", "exp:MEAN" or "lognormal:MU,SIGMA" (seconds)
+    "llm_latency": os.getenv("STUB_LLM_LATENCY", "uniform:0.2,0.8"),
+    "youtube_latency": os.getenv("STUB_YOUTUBE_LATENCY", "fixed:0.1"),
+    # Random 429s on LLM calls, plus periodic bursts where every LLM call gets a 429
+    "error_rate": float(os.getenv("STUB_ERROR_RATE", "0")),
+    "burst_every": float(os.getenv("STUB_BURST_EVERY", "0")),
+    "burst_length": float(os.getenv("STUB_BURST_LENGTH", "0")),
+    # Echo the text being summarized instead of returning canned filler
+    "echo": os.getenv("STUB_ECHO", "false").lower() == "true",
+    # Supabase REST: latency and the share of writes answered with a 503
+    "supabase_latency": os.getenv("STUB_SUPABASE_LATENCY", "fixed:0.02"),
+    "supabase_error_rate": float(os.getenv("STUB_SUPABASE_ERROR_RATE", "0")),
+}
+stats: Dict[str, int] = {}
+# Supabase tables: name -> {row key: row}
+tables: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+started = time.monotonic()
+rng = random.Random(int(os.getenv("STUB_SEED", "0")))
+
+app = FastAPI(title="Provider stub")
+
+
+def sample_latency(spec: str) -> float:
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return values[0]
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1])
+    if kind == "exp":
+        return rng.expovariate(1 / values[0])
+    if kind == "lognormal":
+        return rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def count(name: str):
+    stats[name] = stats.get(name, 0) + 1
+
+
+def throttled() -> bool:
+    if config["burst_every"] > 0:
+        phase = (time.monotonic() - started) % config["burst_every"]
+        if phase < config["burst_length"]:
+            return True
+    return rng.random() < config["error_rate"]
+
+
+def completion_text(prompt: str) -> str:
+    if config["echo"]:
+        # Echo only the document part so the backend's prompt-leak check doesn't reject it
+        text = prompt.split("Text to summarize:", 1)[-1]
+        words = text.split()[:150]
+        return " ".join(words) or "empty prompt"
+    words = rng.choices(VOCABULARY, k=rng.randint(80, 160))
+    return ". ".join(" ".join(words[i:i + 10]).capitalize() for i in range(0, len(words), 10)) + "."
+
+
+def rate_limited(api: str) -> JSONResponse:
+    count(f"{api}_429")
+    return JSONResponse(
+        {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}},
+        status_code=429,
+        headers={"retry-after": "1"}
+    )
+
+
+# -----------------------------
+# OpenAI-compatible (Fireworks at /v1, Groq at /openai/v1)
+# -----------------------------
+@app.post("/v1/chat/completions")
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(sample_latency(config["llm_latency"]))
+    if throttled():
+        return rate_limited("openai")
+    count("openai")
+    prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+    text = completion_text(prompt)
+    return {
+        "id": f"stub-{stats['openai']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(text) // 4,
+            "total_tokens": (len(prompt) + len(text)) // 4,
+        },
+    }
+
+
+# -----------------------------
+# Gemini REST
+# -----------------------------
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(sample_latency(config["llm_latency"]))
+    if throttled():
+        return rate_limited("gemini")
+    count("gemini")
+    prompt = "\n".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": completion_text(prompt)}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 4},
+    }
+
+
+# -----------------------------
+# YouTube Data API v3
+# -----------------------------
+@app.get("/youtube/v3/search")
+async def youtube_search(q: str = "", maxResults: int = 6):
+    await asyncio.sleep(sample_latency(config["youtube_latency"]))
+    count("youtube")
+    items = []
+    for i in range(min(maxResults, 50)):
+        video_id = f"stub{abs(hash((q, i))) % 10**7:07d}"
+        items.append({
+            "id": {"kind": "youtube#video", "videoId": video_id},
+            "snippet": {
+                "title": f"{q} ({i + 1})",
+                "channelTitle": "Stub Channel",
+                "publishedAt": "2024-01-01T00:00:00Z",
+                "thumbnails": {"high": {"url": f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"}},
+            },
+        })
+    return {"kind": "youtube#searchListResponse", "items": items}
+
+
+# -----------------------------
+# Supabase REST (PostgREST)
+# -----------------------------
+@app.post("/rest/v1/{table}")
+async def supabase_insert(table: str, request: Request, on_conflict: str = ""):
+    if not request.headers.get("apikey"):
+        return JSONResponse({"message": "No API key found in request"}, status_code=401)
+    await asyncio.sleep(sample_latency(config["supabase_latency"]))
+    if rng.random() < config["supabase_error_rate"]:
+        count("supabase_503")
+        return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+
+    rows = await request.json()
+    if isinstance(rows, dict):
+        rows = [rows]
+    rows_by_key = tables.setdefault(table, {})
+    columns = [c for c in on_conflict.split(",") if c]
+    upsert = "merge-duplicates" in request.headers.get("prefer", "")
+    if len({frozenset(row) for row in rows}) > 1:
+        # PostgREST needs every object in a bulk insert to have the same keys
+        count("supabase_400")
+        return JSONResponse({"code": "PGRST102", "message": "All object keys must match"}, status_code=400)
+    if columns and upsert:
+        # Like Postgres, refuse a bulk upsert that would update the same row twice
+        keys = [tuple(row.get(c) for c in columns) for row in rows]
+        if len(set(keys)) < len(keys):
+            count("supabase_duplicate_batches")
+            return JSONResponse({
+                "code": "21000",
+                "message": "ON CONFLICT DO UPDATE command cannot affect row a second time",
+            }, status_code=500)
+    for row in rows:
+        if columns:
+            key = tuple(row.get(c) for c in columns)
+            if key in rows_by_key and not upsert:
+                return JSONResponse({"code": "23505", "message": "duplicate key value"}, status_code=409)
+        else:
+            key = len(rows_by_key)
+        rows_by_key[key] = {**rows_by_key.get(key, {}), **row}
+    count("supabase_writes")
+    return JSONResponse(None, status_code=201)
+
+
+@app.get("/rest/v1/{table}")
+async def supabase_select(table: str):
+    return list(tables.get(table, {}).values())
+
+
+# -----------------------------
+# Control
+# -----------------------------
+@app.post("/_stub/config")
+async def update_config(request: Request):
+    changes = await request.json()
+    for key, value in changes.items():
+        if key not in config:
+            return JSONResponse({"error": f"Unknown setting: {key}"}, status_code=400)
+        if key.endswith("_latency"):
+            try:
+                sample_latency(value)
+            except (ValueError, IndexError):
+                return JSONResponse({"error": f"Bad latency spec: {value}"}, status_code=400)
+        config[key] = value
+    return config
+
+
+@app.get("/_stub/stats")
+async def get_stats():
+    return {
+        "stats": stats,
+        "config": config,
+        "tables": {name: len(rows) for name, rows in tables.items()},
+        "uptime": math.floor(time.monotonic() - started),
+    }
+
+
+@app.post("/_stub/reset")
+async def reset_stats():
+    stats.clear()
+    tables.clear()
+    return {"stats": stats}
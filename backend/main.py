@@ -1,58 +1,151 @@
 # main.py
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import os
+import re
+import json
 import asyncio
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from utils.pdf_utils import extract_text_from_pdf
+from utils import pdf_utils
+from utils.pdf_utils import (
+    CORRUPT_PDF_MESSAGE, EMPTY_PDF_MESSAGE, FITZ_EXECUTOR, SCANNED_PDF_MESSAGE, EmptyPdfError, ScannedPdfScreen,
+    extract_text_from_pdf, iter_pdf_pages, run_fitz
+)
 from fastapi.middleware.cors import CORSMiddleware
-from utils.youtube_utils import recommend_videos_from_summary
-from typing import Dict, List, Any, Optional
+from utils.youtube_utils import recommend_videos_from_summary, build_search_query, search_videos
+from utils.singleflight import SingleFlight, content_key
+from utils.quota import QuotaUnavailableError, get_quota_store
+from utils.write_behind import WriteBehindQueue
+from utils.metrics import (
+    BATCH_PACKED_DOCUMENTS, BATCH_VIDEO_QUERIES, Gauge, REQUEST_LATENCY, TraceIdFilter,
+    render_metrics, run_in_thread, stage, trace_id_var, track_peak_memory
+)
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple
 import time
+import tracemalloc
 import logging
+import uuid
 from contextlib import asynccontextmanager
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.middleware import SlowAPIMiddleware
 from llm.fallback import generate_summary as llm_generate_summary
+from llm.registry import warm_providers
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (every line carries the request's trace id)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(trace_id)s] %(message)s")
+for handler in logging.getLogger().handlers:
+    handler.addFilter(TraceIdFilter())
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 # -----------------------------
-# User Quota: 5 PDFs/hour per IP
+# User Quota: 3 PDFs/hour per IP
 # -----------------------------
-user_pdf_count = {}
+# Sliding-window counters in a shared store (QUOTA_BACKEND=sqlite for multiple workers)
+UPLOAD_QUOTA_LIMIT = int(os.getenv("UPLOAD_QUOTA_LIMIT", "3"))
+UPLOAD_QUOTA_WINDOW = 3600
+# YouTube searches per IP per minute (each costs 100 units of the daily API quota)
+VIDEO_QUOTA_LIMIT = int(os.getenv("VIDEO_QUOTA_LIMIT", "6"))
+VIDEO_QUOTA_WINDOW = 60
+# Batch routes draw on the same keys as the single routes, so batching never buys extra quota
+quota = get_quota_store()
+
+def acquire_quota(key: str, limit: int, cost: int = 1, window: int = UPLOAD_QUOTA_WINDOW) -> Optional[int]:
+    """quota.acquire, but a store too busy to answer counts as over the limit instead of raising."""
+    try:
+        return quota.acquire(key, limit, window, cost)
+    except QuotaUnavailableError as e:
+        logger.error(f"🚨 Quota check failed for {key}: {e}")
+        return None
 
-def is_allowed_upload(ip: str) -> bool:
-    now = time.time()
-    if ip not in user_pdf_count:
-        user_pdf_count[ip] = {"count": 0, "reset_time": now + 3600}
-    elif now > user_pdf_count[ip]["reset_time"]:
-        user_pdf_count[ip] = {"count": 0, "reset_time": now + 3600}
-    return user_pdf_count[ip]["count"] < 3
+def refund_quota(key: str, start: Optional[int], cost: int = 1, window: int = UPLOAD_QUOTA_WINDOW):
+    try:
+        quota.refund(key, window, cost=cost, start=start)
+    except QuotaUnavailableError as e:
+        logger.error(f"🚨 Quota refund failed for {key}: {e}")
 
-def increment_pdf_count(ip: str):
-    if ip in user_pdf_count:
-        user_pdf_count[ip]["count"] += 1
+# -----------------------------
+# Request coalescing
+# -----------------------------
+# Identical concurrent requests (same PDF bytes / text / summary) share one run
+inflight = SingleFlight()
+Gauge("coalescing_inflight_tasks", "Shared tasks currently in flight", inflight.inflight)
+
+# -----------------------------
+# Persistence (write-behind to Supabase)
+# -----------------------------
+# Rows are buffered and upserted in batches off the request path; off unless SUPABASE_URL/KEY are set
+SUMMARIES_TABLE = "summaries"
+VIDEOS_TABLE = "videos"
+USAGE_TABLE = "usage_records"
+persistence = WriteBehindQueue(
+    os.getenv("SUPABASE_URL"),
+    os.getenv("SUPABASE_KEY"),
+    conflict_columns={SUMMARIES_TABLE: "id", VIDEOS_TABLE: "summary_id,video_id"},
+    batch_size=int(os.getenv("PERSIST_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("PERSIST_FLUSH_INTERVAL", "2.0")),
+    max_buffer=int(os.getenv("PERSIST_MAX_BUFFER", "10000")),
+    spill_dir=os.getenv("PERSIST_SPILL_DIR"),
+)
+Gauge("write_behind_buffered_records", "Rows waiting in the write-behind buffer", persistence.pending)
+
+def persist_result(summary_id: str, filename: Optional[str], summary: str, videos: List[Dict[str, Any]]):
+    """Queue a finished summary and its videos. Keyed by content hash, so re-uploads upsert."""
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    persistence.enqueue(SUMMARIES_TABLE, {
+        "id": summary_id, "filename": filename, "summary": summary, "created_at": now
+    })
+    for video in videos:
+        persistence.enqueue(VIDEOS_TABLE, {
+            "summary_id": summary_id, "video_id": video["id"], "title": video["title"],
+            "channel": video["channel"], "url": video["url"], "created_at": now
+        })
+
+def persist_usage(route: str, client_ip: str, status: str, started: float, documents: int = 1):
+    persistence.enqueue(USAGE_TABLE, {
+        "route": route,
+        "client_ip": client_ip,
+        "status": status,
+        "documents": documents,
+        "duration_ms": int((time.perf_counter() - started) * 1000),
+        "trace_id": trace_id_var.get(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
 
 # -----------------------------
 # Lifespan
 # -----------------------------
+def warm_up():
+    pdf_utils.warm()
+    warm_providers()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting PDF Processing API...")
+    # Heavy SDKs are imported lazily; pull them in off the event loop so the
+    # server accepts requests right away (WARM_PROVIDERS=false defers to first use)
+    if os.getenv("WARM_PROVIDERS", "true").lower() != "false":
+        app.state.warm_up = asyncio.create_task(asyncio.to_thread(warm_up))
+    await persistence.start()
     yield
     logger.info("Shutting down...")
+    await persistence.stop()
 
 app = FastAPI(title="PDF Processing API", lifespan=lifespan)
 
 # Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+# Shares the quota store, so per-route limits hold across workers too
+# RATE_LIMITS_ENABLED=false turns the per-route limits off (load tests from a single address)
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri="quota://",
+    # A busy quota store lets the request through rather than failing it with a bare 500
+    swallow_errors=True,
+    enabled=os.getenv("RATE_LIMITS_ENABLED", "true").lower() != "false"
+)
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
 
@@ -70,9 +163,42 @@ app.add_middleware(
     ],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+    allow_headers=["Content-Type", "Authorization", "X-Requested-With", "X-Trace-Id"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# -----------------------------
+# Tracing & request metrics
+# -----------------------------
+# Client-supplied trace ids end up in every log line and in usage rows: keep them short and plain
+TRACE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Clients may pass their own X-Trace-Id; otherwise (or if it looks odd) we mint one
+    trace_id = request.headers.get("X-Trace-Id", "")
+    if not TRACE_ID_PATTERN.fullmatch(trace_id):
+        trace_id = uuid.uuid4().hex[:16]
+    trace_id_var.set(trace_id)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.url.path if request.url.path in ROUTE_PATHS else "other"
+
+    # Stop the clock when the body has been sent, not at the headers, so the
+    # streaming /batch/* routes record their full duration
+    body = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, route=route, status=response.status_code)
+
+    response.body_iterator = timed_body()
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
 # -----------------------------
 # Models
 # -----------------------------
@@ -82,6 +208,13 @@ class SummarizeRequest(BaseModel):
 class SummaryRequest(BaseModel):
     summary: str
 
+class BatchVideoItem(BaseModel):
+    id: str
+    summary: str
+
+class BatchVideoRequest(BaseModel):
+    items: List[BatchVideoItem]
+
 class ProcessingResponse(BaseModel):
     message: str
     filename: str
@@ -93,18 +226,32 @@ class ProcessingResponse(BaseModel):
 # -----------------------------
 # Smart Chunking
 # -----------------------------
-def smart_chunk_text(text: str, max_words: int = 3000) -> List[str]:
-    import re
-    text = re.sub(r'\s+', ' ', text).strip()
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    chunks = []
+def iter_chunks(texts: Iterable[str], max_words: int = 3000) -> Iterator[str]:
+    """
+    Chunk text arriving in pieces (e.g. PDF pages) without joining it first.
+    Yields the same chunks as smart_chunk_text on the pieces joined with newlines;
+    only the current chunk and the unfinished sentence at the end of a piece are held.
+    """
     current_chunk = []
     current_len = 0
-
-    for sentence in sentences:
+    tail = ""  # Last sentence of the previous piece; it may continue in the next one
+
+    def sentences_of(pieces: Iterable[str]) -> Iterator[str]:
+        nonlocal tail
+        for text in pieces:
+            text = re.sub(r'\s+', ' ', text).strip()
+            if not text:
+                continue
+            sentences = re.split(r'(?<=[.!?])\s+', f"{tail} {text}" if tail else text)
+            tail = sentences.pop()
+            yield from sentences
+        if tail:
+            yield tail
+
+    for sentence in sentences_of(texts):
         word_count = len(sentence.split())
         if current_len + word_count > max_words and current_chunk:
-            chunks.append(" ".join(current_chunk))
+            yield " ".join(current_chunk)
             current_chunk = [sentence]
             current_len = word_count
         else:
@@ -112,31 +259,51 @@ def smart_chunk_text(text: str, max_words: int = 3000) -> List[str]:
             current_len += word_count
 
     if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    return chunks
+        yield " ".join(current_chunk)
 
-async def generate_summary_from_text(text: str) -> str:
-    if not text.strip():
-        return "No content to summarize."
+def smart_chunk_text(text: str, max_words: int = 3000) -> List[str]:
+    return list(iter_chunks([text], max_words))
 
-    word_count = len(text.split())
-    if word_count < 600:
-        prompt = get_summary_prompt(text)
-        return await llm_generate_summary(prompt)
+# Below this many words a document is summarized in one call (and can be packed in batches)
+SMALL_DOCUMENT_WORDS = 600
 
-    chunks = smart_chunk_text(text, 3000)
-    tasks = [llm_generate_summary(get_summary_prompt(chunk)) for chunk in chunks]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+async def summarize_prompt(prompt: str) -> str:
+    # Our prompts are complete already; don't let the fallback chain wrap them again
+    return await llm_generate_summary(prompt, wrap=False)
 
+async def reduce_summaries(results: List[Any], summarize: Callable[[str], Awaitable[str]]) -> str:
+    """Combine the per-chunk results (strings or exceptions) into the final summary."""
     summaries = [r for r in results if isinstance(r, str) and len(r.strip()) > 20]
     if not summaries:
         return "No valid summary could be generated."
 
     combined = "\n\n---\n\n".join(summaries)
     final_prompt = get_summary_prompt(combined)
-    final = await llm_generate_summary(final_prompt)
+    with stage("reduce"):
+        final = await summarize(final_prompt)
     return final or "Summary could not be finalized."
 
+async def generate_summary_from_text(
+    text: str, summarize: Optional[Callable[[str], Awaitable[str]]] = None
+) -> str:
+    # Batches pass their own `summarize` so every call goes through one shared scheduler
+    summarize = summarize or summarize_prompt
+    if not text.strip():
+        return "No content to summarize."
+
+    word_count = len(text.split())
+    if word_count < SMALL_DOCUMENT_WORDS:
+        prompt = get_summary_prompt(text)
+        with stage("map"):
+            return await summarize(prompt)
+
+    with stage("chunk"):
+        chunks = smart_chunk_text(text, 3000)
+    tasks = [summarize(get_summary_prompt(chunk)) for chunk in chunks]
+    with stage("map"):
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    return await reduce_summaries(results, summarize)
+
 def get_summary_prompt(text: str) -> str:
     word_count = len(text.split())
     target_length = max(5, min(36900, int(word_count * 0.20)))
@@ -151,6 +318,342 @@ Text to summarize:
 {text.strip()}
 """
 
+# What extract_text_from_pdf returns instead of text for an unusable PDF
+REJECTION_INDICATORS = {CORRUPT_PDF_MESSAGE, SCANNED_PDF_MESSAGE, EMPTY_PDF_MESSAGE}
+
+# -----------------------------
+# PDF pipeline
+# -----------------------------
+# buffered: extract the whole text, then chunk and summarize it (default)
+# bounded:  stream pages -> chunks -> LLM with at most PIPELINE_WINDOW chunks in flight,
+#           so peak memory stays flat however many pages the PDF has
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "buffered").lower()
+PIPELINE_WINDOW = int(os.getenv("PIPELINE_WINDOW", "4"))
+
+# Per-request peak memory (request_peak_memory_bytes) needs tracemalloc, which slows allocation down
+if os.getenv("MEMORY_TRACE", "false").lower() == "true" and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+async def process_pdf(content: bytes) -> Dict[str, Any]:
+    """
+    Extract, summarize and find videos for one PDF.
+    Returns {"summary", "videos"} or {"rejected": message} for unusable PDFs.
+    Runs once per distinct file even when many clients upload it at the same time.
+    """
+    with track_peak_memory("/upload-pdf"):
+        if PIPELINE_MODE == "bounded":
+            result = await process_pdf_bounded(content)
+        else:
+            result = await process_pdf_buffered(content)
+        if "rejected" in result:
+            return result
+        result["videos"] = await recommend_videos_for(result["summary"])
+        return result
+
+async def process_pdf_buffered(content: bytes) -> Dict[str, Any]:
+    # Extract text
+    logger.info("🔍 Starting text extraction...")
+    with stage("extract"):
+        text = await run_fitz(extract_text_from_pdf, content)
+    logger.info(f"📝 Text extracted. Length: {len(text)}, Preview: '{text[:200]}...'")
+
+    # Check if the returned text is a rejection message
+    if text.strip() in REJECTION_INDICATORS:
+        # ✅ Log the full text preview, but return a clean, safe error
+        logger.warning(f"🚫 Rejected content: '{text[:100]}...'")
+        return {"rejected": text.strip()}
+
+    # Generate summary
+    logger.info("🧠 Starting summarization pipeline...")
+    summary = await generate_summary_from_text(text)
+    logger.info(f"✅ Summary generated. Length: {len(summary)}")
+    return {"summary": summary}
+
+async def process_pdf_bounded(content: bytes) -> Dict[str, Any]:
+    """
+    Same result as process_pdf_buffered without ever holding the whole text:
+    pages are screened and chunked as they are read, and each chunk goes to the LLM
+    as soon as it is complete. Reading pauses while PIPELINE_WINDOW chunks are in flight.
+    """
+    screen = ScannedPdfScreen()
+    window = asyncio.Semaphore(PIPELINE_WINDOW)
+    held: List[str] = []  # Chunks waiting for the scanned-PDF screen to pass
+    tasks: List[asyncio.Future] = []
+    word_count = 0
+
+    def screened_pages(pages: Iterator[str]) -> Iterator[str]:
+        nonlocal word_count
+        for text in pages:
+            screen.add(text)
+            word_count += len(text.split())
+            yield text
+
+    async def summarize_chunk(chunk: str) -> str:
+        try:
+            return await summarize_prompt(get_summary_prompt(chunk))
+        finally:
+            window.release()
+
+    async def submit(chunk: str):
+        # Backpressure: don't read further pages until a slot frees up
+        await window.acquire()
+        tasks.append(asyncio.ensure_future(summarize_chunk(chunk)))
+
+    logger.info("🔍 Starting streaming extraction + summarization...")
+    pages = iter_pdf_pages(content)
+    chunks = iter_chunks(screened_pages(pages), 3000)
+    try:
+        with stage("extract"):
+            while True:
+                # Pages are read and chunked on the fitz thread, one chunk per hop
+                chunk = await run_fitz(next, chunks, None)
+                if chunk is None:
+                    break
+                held.append(chunk)
+                # Short documents get a single call below, so only submit once we know it isn't one
+                if screen.accepted and word_count >= SMALL_DOCUMENT_WORDS:
+                    while held:
+                        await submit(held.pop(0))
+    except EmptyPdfError:
+        return {"rejected": EMPTY_PDF_MESSAGE}
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        logger.error(f"Text extraction failed: {e}")
+        return {"rejected": CORRUPT_PDF_MESSAGE}
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        # Queued behind any read still running, so the document is closed on the fitz thread too
+        FITZ_EXECUTOR.submit(pages.close)
+
+    rejection = screen.verdict()
+    if rejection:
+        logger.warning(f"🚫 Rejected content: '{rejection[:100]}...'")
+        return {"rejected": rejection}
+    logger.info(f"📝 Text streamed. Words: {word_count}")
+
+    if word_count < SMALL_DOCUMENT_WORDS:
+        # A short document is one (still unsubmitted) chunk: summarize it in one call
+        with stage("map"):
+            summary = await summarize_prompt(get_summary_prompt(" ".join(held)))
+    else:
+        while held:
+            await submit(held.pop(0))
+        with stage("map"):
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        summary = await reduce_summaries(results, summarize_prompt)
+    logger.info(f"✅ Summary generated. Length: {len(summary)}")
+    return {"summary": summary}
+
+async def recommend_videos_for(summary: str) -> List[Dict[str, Any]]:
+    if "could not generate summary" in summary.lower() or len(summary) < 100:
+        logger.info("ℹ️ Skipping video recommendations due to poor summary.")
+        return []
+    try:
+        with stage("videos"):
+            videos = await run_in_thread("youtube", recommend_videos_from_summary, summary)
+        logger.info(f"🎥 Found {len(videos)} video recommendations")
+        return videos
+    except Exception as e:
+        logger.warning(f"📹 Video recommendation failed: {e}")
+        return []
+
+# -----------------------------
+# Batch processing
+# -----------------------------
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "200"))
+# Total upload size per batch call (each file is still capped at 15 MB like /upload-pdf)
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(50 * 1024 * 1024)))
+# LLM calls in flight at once for one batch, shared by all of its documents
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+BATCH_YOUTUBE_CONCURRENCY = 4
+# Small documents are packed into one prompt up to these limits
+PACK_MAX_WORDS = 3000
+PACK_MAX_DOCUMENTS = 8
+
+PACK_HEADER = re.compile(r"=+\s*DOCUMENT\s+(\d+)\s*=+", re.IGNORECASE)
+
+def get_packed_summary_prompt(texts: List[str]) -> str:
+    sections = "\n\n".join(f"=== DOCUMENT {i} ===\n{text.strip()}" for i, text in enumerate(texts, 1))
+    return f"""
+Summarize each of the following {len(texts)} documents separately.
+Start each summary with the document's header line exactly as given (for example "=== DOCUMENT 1 ===").
+Keep each summary to about 20% of its document's length.
+Do not use markdown. Use plain text only.
+
+{sections}
+"""
+
+def split_packed_summary(result: str, count: int) -> List[Optional[str]]:
+    """Per-document summaries from a packed response; None where a section is missing or too short."""
+    summaries: List[Optional[str]] = [None] * count
+    parts = PACK_HEADER.split(result or "")
+    for number, body in zip(parts[1::2], parts[2::2]):
+        index = int(number) - 1
+        if 0 <= index < count and len(body.strip()) > 20:
+            summaries[index] = body.strip()
+    return summaries
+
+def pack_small_documents(texts: Dict[int, str]) -> List[List[int]]:
+    """Greedily group small documents into packs of at most PACK_MAX_WORDS / PACK_MAX_DOCUMENTS."""
+    packs, current, current_words = [], [], 0
+    for index, text in texts.items():
+        words = len(text.split())
+        if current and (current_words + words > PACK_MAX_WORDS or len(current) >= PACK_MAX_DOCUMENTS):
+            packs.append(current)
+            current, current_words = [], 0
+        current.append(index)
+        current_words += words
+    if current:
+        packs.append(current)
+    return packs
+
+async def summarize_batch(texts: Dict[int, str]) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Summarize many documents in one scheduling pass and yield (index, summary) as each finishes.
+    All LLM calls share one concurrency window; small documents are packed several per prompt
+    and fall back to their own call when the packed answer can't be split.
+    """
+    semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def summarize(prompt: str) -> str:
+        async with semaphore:
+            return await summarize_prompt(prompt)
+
+    async def summarize_pack(indices: List[int]) -> List[Optional[str]]:
+        if len(indices) == 1:
+            return [None]
+        BATCH_PACKED_DOCUMENTS.inc(len(indices))
+        with stage("map"):
+            result = await summarize(get_packed_summary_prompt([texts[i] for i in indices]))
+        return split_packed_summary(result, len(indices))
+
+    small = {i: text for i, text in texts.items() if 0 < len(text.split()) < SMALL_DOCUMENT_WORDS}
+    packed: Dict[int, Tuple[asyncio.Future, int]] = {}
+    for pack in pack_small_documents(small):
+        future = asyncio.ensure_future(summarize_pack(pack))
+        for position, index in enumerate(pack):
+            packed[index] = (future, position)
+
+    async def one(index: int) -> Tuple[int, str]:
+        if index in packed:
+            future, position = packed[index]
+            summary = (await future)[position]
+            if summary:
+                return index, summary
+        return index, await generate_summary_from_text(texts[index], summarize)
+
+    tasks = [asyncio.ensure_future(one(i)) for i in texts]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client went away mid-stream: stop the remaining work
+        for task in tasks + [future for future, _ in packed.values()]:
+            task.cancel()
+
+def _ndjson(item: Dict[str, Any]) -> str:
+    return json.dumps(item) + "\n"
+
+async def read_batch_document(filename: str, content: bytes) -> Dict[str, Any]:
+    """
+    Validate and extract one batch PDF as soon as it is read.
+    Keeps only what the rest of the batch needs (name, content hash, text), never the bytes.
+    """
+    if len(content) > 15 * 1024 * 1024:
+        return {"filename": filename, "status": "too_large", "error": "File too large"}
+    if not content.startswith(b"%PDF"):
+        return {"filename": filename, "status": "invalid_pdf", "error": "Invalid PDF"}
+
+    with stage("extract"):
+        text = await run_fitz(extract_text_from_pdf, content)
+    if text.strip() in REJECTION_INDICATORS:
+        return {"filename": filename, "status": "invalid_content", "error": text.strip()}
+    key = await run_in_thread("hash", content_key, "upload-pdf", content)
+    return {"filename": filename, "id": key[1], "text": text}
+
+async def stream_batch_summaries(
+    documents: List[Dict[str, Any]], quota_key: str, quota_window: int, client_ip: str
+) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    failed = 0
+    texts: Dict[int, str] = {}
+
+    try:
+        # Report the rejects first; the LLM pass is planned across all the remaining texts
+        for index, document in enumerate(documents):
+            if "text" in document:
+                texts[index] = document.pop("text")
+            else:
+                failed += 1
+                yield _ndjson({
+                    "index": index, "filename": document["filename"],
+                    "status": document["status"], "error": document["error"]
+                })
+
+        async for index, summary in summarize_batch(texts):
+            document = documents[index]
+            persist_result(document["id"], document["filename"], summary, [])
+            yield _ndjson({
+                "index": index, "filename": document["filename"],
+                "status": "completed", "summary": summary
+            })
+        logger.info(f"📦 Batch finished: {len(texts)} summarized, {failed} rejected")
+    finally:
+        if failed:
+            refund_quota(quota_key, quota_window, cost=failed)
+        persist_usage("/batch/summarize", client_ip, "completed", started, documents=len(documents))
+
+def plan_video_queries(items: List[BatchVideoItem]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Many summaries in a course batch boil down to the same keywords: search each query once.
+    Returns the ids with no usable query and {query: item ids}.
+    """
+    empty: List[str] = []
+    by_query: Dict[str, List[str]] = {}
+    for item in items:
+        query = build_search_query(item.summary)
+        if query is None:
+            empty.append(item.id)
+        else:
+            by_query.setdefault(query, []).append(item.id)
+    return empty, by_query
+
+async def stream_batch_videos(
+    empty: List[str], by_query: Dict[str, List[str]], client_ip: str
+) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    completed = False
+    for item_id in empty:
+        yield _ndjson({"id": item_id, "success": True, "data": [], "count": 0})
+
+    BATCH_VIDEO_QUERIES.inc(len(by_query), role="unique")
+    BATCH_VIDEO_QUERIES.inc(sum(len(ids) for ids in by_query.values()) - len(by_query), role="deduplicated")
+
+    search_slots = asyncio.Semaphore(BATCH_YOUTUBE_CONCURRENCY)
+
+    async def search(query: str) -> Tuple[str, List[Dict[str, Any]]]:
+        async with search_slots:
+            return query, await run_in_thread("youtube", search_videos, query)
+
+    tasks = [asyncio.ensure_future(search(query)) for query in by_query]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            query, videos = await next_done
+            for item_id in by_query[query]:
+                yield _ndjson({"id": item_id, "success": True, "data": videos, "count": len(videos)})
+        completed = True
+    finally:
+        for task in tasks:
+            task.cancel()
+        documents = len(empty) + sum(len(ids) for ids in by_query.values())
+        persist_usage(
+            "/batch/recommend-videos", client_ip, "completed" if completed else "failed", started, documents=documents
+        )
+
 # -----------------------------
 # Routes
 # -----------------------------
@@ -165,18 +668,24 @@ async def upload_pdf(request: Request, file: UploadFile = File(...)):
     client_ip = request.client.host
     logger.info(f"📥 Upload initiated from {client_ip}")
 
-    # Rate limit
-    if not is_allowed_upload(client_ip):
+    # Rate limit: take a slot up front so concurrent uploads can't overshoot,
+    # and give it back below unless the upload completes
+    quota_key = f"upload:{client_ip}"
+    quota_window = acquire_quota(quota_key, UPLOAD_QUOTA_LIMIT)
+    if quota_window is None:
         logger.warning(f"🚨 Rate limit exceeded for {client_ip}")
         return JSONResponse(
             {"error": "Hourly limit exceeded. Try again later.", "status": "rate_limited"},
             status_code=429
         )
 
+    started = time.perf_counter()
+    completed = False
     try:
         # Read file
         logger.info(f"📄 Reading file: '{file.filename}' ({file.size} bytes)")
-        content = await file.read()
+        with stage("read"):
+            content = await file.read()
 
         # File size check
         if len(content) > 15 * 1024 * 1024:
@@ -194,48 +703,24 @@ async def upload_pdf(request: Request, file: UploadFile = File(...)):
                 status_code=400
             )
 
-        # Extract text
-        logger.info("🔍 Starting text extraction...")
-        text = extract_text_from_pdf(content)
-        logger.info(f"📝 Text extracted. Length: {len(text)}, Preview: '{text[:200]}...'")
+        # Hashing up to 15 MB takes a while; hashlib releases the GIL, so do it off the loop
+        key = await run_in_thread("hash", content_key, "upload-pdf", content)
+        result = await inflight.do(key, lambda: process_pdf(content))
 
-        REJECTION_INDICATORS = {
-            "Could not extract text from PDF. The file may be corrupted or encrypted.",
-            "Scanned PDFs are not supported. Please upload a text-based PDF.",
-            "Empty PDF: No pages found."
-        }
-
-        # Check if the returned text is a rejection message (short and matches known patterns)
-        if any(indicator in text.lower() for indicator in REJECTION_INDICATORS):
-            # ✅ Log the full text preview, but return a clean, safe error
-            logger.warning(f"🚫 Rejected content: '{text[:100]}...'")
+        if "rejected" in result:
             return JSONResponse(
                 {
-                    "error": text.strip(),  # Still send the message, but it's now short
+                    "error": result["rejected"],  # Still send the message, but it's now short
                     "status": "invalid_content"
                 },
                 status_code=422
             )
+        summary = result["summary"]
+        videos = result["videos"]
 
-        # Generate summary
-        logger.info("🧠 Starting summarization pipeline...")
-        summary = await generate_summary_from_text(text)
-        logger.info(f"✅ Summary generated. Length: {len(summary)}")
-
-        # Get videos
-        if "could not generate summary" in summary.lower() or len(summary) < 100:
-            videos = []
-            logger.info("ℹ️ Skipping video recommendations due to poor summary.")
-        else:
-            try:
-                videos = recommend_videos_from_summary(summary)
-                logger.info(f"🎥 Found {len(videos)} video recommendations")
-            except Exception as e:
-                logger.warning(f"📹 Video recommendation failed: {e}")
-                videos = []
-
-        # Success: increment count
-        increment_pdf_count(client_ip)
+        # Success: keep the quota slot
+        completed = True
+        persist_result(key[1], file.filename, summary, videos)
         logger.info("🎉 Upload completed successfully")
 
         return {
@@ -254,32 +739,121 @@ async def upload_pdf(request: Request, file: UploadFile = File(...)):
             {"error": "Processing failed. Please try again.", "status": "error"},
             status_code=500
         )
+    finally:
+        if not completed:
+            refund_quota(quota_key, quota_window)
+        persist_usage("/upload-pdf", client_ip, "completed" if completed else "failed", started)
 
 @app.post("/summarize")
 @limiter.limit("10/minute")
 async def summarize_text(request: Request, payload: SummarizeRequest):
+    started = time.perf_counter()
+    completed = False
     try:
         text = payload.text.strip()
         if not text:
             return JSONResponse({"error": "No text provided"}, status_code=400)
-        summary = await generate_summary_from_text(text)
+        key = content_key("summarize", text)
+        summary = await inflight.do(key, lambda: generate_summary_from_text(text))
+        completed = True
+        # No file behind pasted text: the row is keyed by the text's hash, without a filename
+        persist_result(key[1], None, summary, [])
         return {"summary": summary, "status": "completed"}
     except Exception as e:
         logger.error(f"Summarization error: {e}")
         return JSONResponse(
             {"error": "Failed to summarize text."}, status_code=500
         )
+    finally:
+        persist_usage("/summarize", request.client.host, "completed" if completed else "failed", started)
 
 @app.post("/recommend-videos")
 @limiter.limit("6/minute")
 async def recommend_videos(request: Request, data: SummaryRequest):
+    if acquire_quota(f"videos:{request.client.host}", VIDEO_QUOTA_LIMIT, window=VIDEO_QUOTA_WINDOW) is None:
+        return JSONResponse({"success": False, "error": "Too many video searches. Try again later."}, status_code=429)
+    # Videos are only stored against a summary id (/upload-pdf); here we just record the usage
+    started = time.perf_counter()
+    completed = False
     try:
-        recommendations = recommend_videos_from_summary(data.summary)
+        recommendations = await inflight.do(
+            content_key("recommend-videos", data.summary),
+            lambda: run_in_thread("youtube", recommend_videos_from_summary, data.summary)
+        )
+        completed = True
         return {"success": True, "data": recommendations, "count": len(recommendations)}
     except Exception as e:
         logger.error(f"Video recommendation failed: {e}")
         return {"success": False, "error": "Could not fetch videos."}
+    finally:
+        persist_usage("/recommend-videos", request.client.host, "completed" if completed else "failed", started)
+
+@app.post("/batch/summarize")
+@limiter.limit("2/minute")
+async def batch_summarize(request: Request, files: List[UploadFile] = File(...)):
+    """Summarize many PDFs in one call. Streams one NDJSON line per document as it completes."""
+    client_ip = request.client.host
+    if len(files) > BATCH_MAX_DOCUMENTS:
+        return JSONResponse(
+            {"error": f"Too many documents (max {BATCH_MAX_DOCUMENTS})", "status": "too_large"},
+            status_code=413
+        )
+
+    # Every document counts against the same hourly quota as /upload-pdf
+    quota_key = f"upload:{client_ip}"
+    quota_window = acquire_quota(quota_key, UPLOAD_QUOTA_LIMIT, cost=len(files))
+    if quota_window is None:
+        logger.warning(f"🚨 Batch limit exceeded for {client_ip}")
+        return JSONResponse(
+            {"error": "Hourly limit exceeded. Try again later.", "status": "rate_limited"},
+            status_code=429
+        )
+
+    # Upload files may be closed once the handler returns, so read them here, extracting
+    # each one straight away so that only its text is kept rather than the whole batch's bytes
+    documents, total = [], 0
+    for file in files:
+        content = await file.read()
+        total += len(content)
+        if total > BATCH_MAX_BYTES:
+            refund_quota(quota_key, quota_window, cost=len(files))
+            return JSONResponse({"error": "Batch too large", "status": "too_large"}, status_code=413)
+        documents.append(await read_batch_document(file.filename, content))
+        del content
+
+    logger.info(f"📦 Batch of {len(documents)} PDFs from {client_ip}")
+    return StreamingResponse(stream_batch_summaries(documents, quota_key, quota_window, client_ip), media_type="application/x-ndjson")
+
+@app.post("/batch/recommend-videos")
+@limiter.limit("2/minute")
+async def batch_recommend_videos(request: Request, data: BatchVideoRequest):
+    """Video recommendations for many summaries. Streams one NDJSON line per item."""
+    if len(data.items) > BATCH_MAX_DOCUMENTS:
+        return JSONResponse(
+            {"success": False, "error": f"Too many items (max {BATCH_MAX_DOCUMENTS})"},
+            status_code=413
+        )
+
+    # Each distinct search counts against the same per-minute quota as /recommend-videos
+    empty, by_query = plan_video_queries(data.items)
+    if by_query and acquire_quota(
+        f"videos:{request.client.host}", VIDEO_QUOTA_LIMIT, cost=len(by_query), window=VIDEO_QUOTA_WINDOW
+    ) is None:
+        return JSONResponse(
+            {"success": False, "error": f"Too many video searches ({len(by_query)}). Try again later."},
+            status_code=429
+        )
+    return StreamingResponse(
+        stream_batch_videos(empty, by_query, request.client.host), media_type="application/x-ndjson"
+    )
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics():
+    # Per-worker figures; scrape each worker (or run one) for exact totals
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+ROUTE_PATHS = {route.path for route in app.routes}
\ No newline at end of file
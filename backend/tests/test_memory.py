@@ -0,0 +1,52 @@
+# tests/test_memory.py
+"""
+Peak Python heap of the PDF pipeline on a large document, read from the app's own
+request_peak_memory_bytes metric (the same numbers benchmarks/run.py gates on).
+
+    cd backend
+    python -m pytest tests/test_memory.py
+"""
+import asyncio
+import os
+import tracemalloc
+
+import pytest
+
+# The app reads these at import time; the fakes replace everything that would use them
+os.environ.setdefault("YOUTUBE_API_KEY", "test")
+os.environ.setdefault("QUOTA_BACKEND", "memory")
+
+import main  # noqa: E402
+from benchmarks.corpus import make_pdf  # noqa: E402
+from benchmarks.fakes import FakeLLM, FakeYouTube, PROVIDER_NAMES, install_fakes  # noqa: E402
+from utils.metrics import REQUEST_PEAK_MEMORY  # noqa: E402
+
+MB = 1024 * 1024
+MEMORY_BUDGET_MB = 4.0  # Same as benchmarks/run.py --memory-budget-mb
+
+
+@pytest.fixture(scope="module")
+def large_pdf():
+    install_fakes([FakeLLM(latency=0, jitter=0, seed=i) for i in range(len(PROVIDER_NAMES))], FakeYouTube(latency=0))
+    return make_pdf(500, "text")
+
+
+def peak_heap_mb(monkeypatch, content: bytes, mode: str) -> float:
+    monkeypatch.setattr(main, "PIPELINE_MODE", mode)
+    labels = {"route": "/upload-pdf", "overlapped": "false"}
+    count, total = REQUEST_PEAK_MEMORY.count(**labels), REQUEST_PEAK_MEMORY.sum(**labels)
+    tracemalloc.start()
+    try:
+        result = asyncio.run(main.process_pdf(content))
+    finally:
+        tracemalloc.stop()
+    assert "summary" in result
+    assert REQUEST_PEAK_MEMORY.count(**labels) == count + 1
+    return (REQUEST_PEAK_MEMORY.sum(**labels) - total) / MB
+
+
+def test_bounded_pipeline_stays_under_the_memory_budget(monkeypatch, large_pdf):
+    bounded = peak_heap_mb(monkeypatch, large_pdf, "bounded")
+    buffered = peak_heap_mb(monkeypatch, large_pdf, "buffered")
+    assert bounded < MEMORY_BUDGET_MB
+    assert bounded < buffered
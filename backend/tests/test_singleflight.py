@@ -0,0 +1,96 @@
+# tests/test_singleflight.py
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight, content_key
+
+KEY = content_key("test", b"same pdf bytes")
+
+
+def test_content_key_is_stable_across_str_and_bytes():
+    assert content_key("summarize", "text") == content_key("summarize", b"text")
+    assert content_key("summarize", "text") != content_key("recommend-videos", "text")
+
+
+def test_concurrent_callers_share_one_run():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "summary"
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do(KEY, work) for _ in range(5)))
+        return results, flight.inflight()
+
+    results, inflight = asyncio.run(scenario())
+    assert results == ["summary"] * 5
+    assert calls == 1
+    assert inflight == 0
+
+
+def test_cancelled_waiter_does_not_affect_the_others():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "summary"
+
+    async def scenario():
+        flight = SingleFlight()
+        leaving = asyncio.ensure_future(flight.do(KEY, work))
+        staying = asyncio.ensure_future(flight.do(KEY, work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(scenario()) == "summary"
+
+
+def test_last_waiter_leaving_cancels_the_work_and_next_caller_starts_fresh():
+    started = []
+
+    async def scenario():
+        flight = SingleFlight()
+        was_cancelled = asyncio.Event()
+
+        async def work():
+            started.append(len(started))
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                was_cancelled.set()
+                raise
+            return f"run {started[-1]}"
+
+        waiter = asyncio.ensure_future(flight.do(KEY, work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # The shared task may still be unwinding; a new caller must not join it
+        result = await flight.do(KEY, work)
+        return result, was_cancelled.is_set(), flight.inflight()
+
+    result, was_cancelled, inflight = asyncio.run(scenario())
+    assert was_cancelled
+    assert started == [0, 1]
+    assert result == "run 1"
+    assert inflight == 0
+
+
+def test_exception_reaches_every_waiter():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do(KEY, work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) and str(r) == "provider down" for r in results)
@@ -0,0 +1,203 @@
+# tests/test_write_behind.py
+"""
+WriteBehindQueue against the in-process Supabase stand-in (loadtest/stub_server.py).
+
+    cd backend
+    python -m pytest tests/test_write_behind.py
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import os
+
+import httpx
+import pytest
+
+from loadtest import stub_server
+from utils.write_behind import WriteBehindQueue
+
+
+@pytest.fixture(autouse=True)
+def stub():
+    stub_server.tables.clear()
+    stub_server.stats.clear()
+    stub_server.config.update(supabase_latency="fixed:0", supabase_error_rate=0.0)
+    yield stub_server
+    stub_server.tables.clear()
+    stub_server.config.update(supabase_error_rate=0.0)
+
+
+def make_queue(spill_dir, **kwargs) -> WriteBehindQueue:
+    # A long flush interval keeps the background task out of the way; tests flush explicitly
+    options = dict(batch_size=100, flush_interval=3600, max_backoff=0.01)
+    options.update(kwargs)
+    return WriteBehindQueue(
+        "http://supabase.stub", "test",
+        conflict_columns={"summaries": "id", "videos": "summary_id,video_id"},
+        spill_dir=str(spill_dir), transport=httpx.ASGITransport(app=stub_server.app),
+        **options,
+    )
+
+
+def summary(i, **extra):
+    return {"id": f"doc-{i}", "filename": f"doc-{i}.pdf", "summary": "text", **extra}
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_failed_flush_keeps_rows_for_retry(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path)
+        await queue.start()
+        for i in range(5):
+            queue.enqueue("summaries", summary(i))
+
+        stub_server.config["supabase_error_rate"] = 1.0
+        with pytest.raises(httpx.HTTPStatusError):
+            await queue.flush()
+        assert queue.pending() == 5
+        assert "summaries" not in stub_server.tables
+
+        stub_server.config["supabase_error_rate"] = 0.0
+        await queue.flush()
+        assert queue.pending() == 0
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert len(stub_server.tables["summaries"]) == 5
+
+
+def test_background_task_retries_until_flushed(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path, batch_size=10, flush_interval=0.01)
+        await queue.start()
+        stub_server.config["supabase_error_rate"] = 1.0
+        for i in range(25):
+            queue.enqueue("summaries", summary(i))
+        await asyncio.sleep(0.1)
+        assert queue.pending() == 25
+
+        stub_server.config["supabase_error_rate"] = 0.0
+        for _ in range(200):
+            if len(stub_server.tables.get("summaries", {})) == 25:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert len(stub_server.tables["summaries"]) == 25
+    assert stub_server.stats["supabase_503"] > 0
+
+
+def test_overflow_is_spilled_off_the_request_path_and_replayed(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path, max_buffer=5)
+        await queue.start()
+        stub_server.config["supabase_error_rate"] = 1.0
+        for i in range(12):
+            queue.enqueue("summaries", summary(i))
+        # enqueue() itself never touches the disk
+        assert queue.pending() == 12
+        assert glob.glob(os.path.join(str(tmp_path), "spill-*.jsonl")) == []
+
+        # Supabase is down at shutdown: everything ends up in the spill file
+        await queue.stop(timeout=1.0)
+        assert len(read_lines(queue.spill_path)) == 12
+
+        # The next process replays the spill once Supabase is back
+        stub_server.config["supabase_error_rate"] = 0.0
+        replay = make_queue(tmp_path)
+        await replay.start()
+        await replay.stop()
+
+    asyncio.run(scenario())
+    assert sorted(stub_server.tables["summaries"]) == sorted((f"doc-{i}",) for i in range(12))
+    assert glob.glob(os.path.join(str(tmp_path), "spill-*")) == []
+
+
+def test_replay_leaves_live_workers_files_and_recovers_orphans(tmp_path):
+    def write_spill(name, rows, tail=""):
+        with open(os.path.join(str(tmp_path), name), "w") as f:
+            for row in rows:
+                f.write(json.dumps({"table": "summaries", "record": row}) + "\n")
+            f.write(tail)
+
+    # Worker 99999 is still running (holds its lock) and may be appending to its file
+    write_spill("spill-99999.jsonl", [summary(1)])
+    live_lock = os.open(os.path.join(str(tmp_path), "spill-99999.lock"), os.O_RDWR | os.O_CREAT)
+    fcntl.flock(live_lock, fcntl.LOCK_EX)
+    # Worker 77777 crashed halfway through replaying worker 88888's file
+    write_spill("spill-88888.jsonl.replaying-77777", [summary(2)], tail='{"table": "summ')
+
+    async def scenario():
+        queue = make_queue(tmp_path)
+        await queue.start()
+        await queue.stop()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        os.close(live_lock)
+    assert sorted(stub_server.tables["summaries"]) == [("doc-2",)]
+    assert sorted(os.path.basename(p) for p in glob.glob(os.path.join(str(tmp_path), "spill-*"))) == [
+        "spill-99999.jsonl", "spill-99999.lock",
+    ]
+
+
+def test_rejected_rows_go_to_dead_letter_without_blocking_others(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path)
+        await queue.start()
+        # Mismatched keys in one bulk insert: PostgREST answers 400, which retrying won't fix
+        queue.enqueue("usage_records", {"route": "/upload-pdf", "status": "completed"})
+        queue.enqueue("usage_records", {"route": "/upload-pdf"})
+        queue.enqueue("summaries", summary(1))
+        await queue.flush()
+        assert queue.pending() == 0
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    dead = read_lines(queue.dead_letter_path)
+    assert [item["table"] for item in dead] == ["usage_records", "usage_records"]
+    assert len(stub_server.tables["summaries"]) == 1
+
+
+def test_duplicate_conflict_keys_in_one_batch_are_collapsed(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path)
+        await queue.start()
+        # 30 students upload the same PDF: same summary id and videos in one flush
+        for n in range(30):
+            queue.enqueue("summaries", summary(1, filename=f"copy-{n}.pdf"))
+            queue.enqueue("videos", {"summary_id": "doc-1", "video_id": "abc", "title": f"take {n}"})
+        queue.enqueue("summaries", summary(2))
+        await queue.flush()
+        assert queue.pending() == 0
+        await queue.stop()
+
+    asyncio.run(scenario())
+    summaries = stub_server.tables["summaries"]
+    assert len(summaries) == 2
+    assert summaries[("doc-1",)]["filename"] == "copy-29.pdf"
+    assert stub_server.tables["videos"][("doc-1", "abc")]["title"] == "take 29"
+    assert "supabase_duplicate_batches" not in stub_server.stats
+
+
+def test_stub_rejects_duplicate_keys_like_postgres(tmp_path):
+    async def scenario():
+        transport = httpx.ASGITransport(app=stub_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://supabase.stub") as client:
+            return await client.post(
+                "/rest/v1/summaries", params={"on_conflict": "id"},
+                headers={"apikey": "test", "Prefer": "resolution=merge-duplicates"},
+                json=[summary(1), summary(1, filename="again.pdf")],
+            )
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 500
+    assert response.json()["code"] == "21000"
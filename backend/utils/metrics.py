@@ -0,0 +1,254 @@
+# utils/metrics.py
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import tracemalloc
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Per-request trace id, set by the HTTP middleware in main.py and attached to every log record
+trace_id_var: contextvars.ContextVar = contextvars.ContextVar("trace_id", default="-")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def render(self):
+        return super().render() + [f"{self.name} {self.fn()}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        row = self._values.get(self._key(labels))
+        return row[-2] if row else 0
+
+    def sum(self, **labels) -> float:
+        row = self._values.get(self._key(labels))
+        return row[-1] if row else 0.0
+
+    def render(self):
+        lines = super().render()
+        for key, row in sorted(self._values.items()):
+            bounds = [str(b) for b in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, row):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {row[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of every registered metric (this worker only)."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the whole body is sent", ["route", "status"]
+)
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Latency of pipeline stages (read, extract, chunk, map, reduce, videos)",
+    ["stage"]
+)
+PROVIDER_LATENCY = Histogram(
+    "llm_provider_duration_seconds",
+    "LLM provider call latency by outcome (success, invalid_output, timeout, error)",
+    ["provider", "outcome"]
+)
+QUEUE_WAIT = Histogram(
+    "queue_wait_seconds", "Time spent waiting for a worker thread before running", ["queue"]
+)
+PAGES_PROCESSED = Counter("pdf_pages_processed_total", "PDF pages run through text extraction")
+TOKENS_PROCESSED = Counter(
+    "llm_tokens_processed_total", "Estimated LLM tokens (~4 chars each) sent and received", ["direction"]
+)
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total",
+    "Requests by route that ran the work (executed) or joined an identical in-flight one (coalesced)",
+    ["route", "role"]
+)
+
+BATCH_PACKED_DOCUMENTS = Counter(
+    "batch_packed_documents_total", "Small batch documents sent to the LLM packed with others"
+)
+BATCH_VIDEO_QUERIES = Counter(
+    "batch_video_queries_total",
+    "YouTube queries in batch lookups that were searched (unique) or reused (deduplicated)",
+    ["role"]
+)
+
+MB = 1024 * 1024
+REQUEST_PEAK_MEMORY = Histogram(
+    "request_peak_memory_bytes",
+    "Peak Python heap growth per request (tracemalloc; MEMORY_TRACE=true). overlapped=\"true\" values are "
+    "approximate: the peak of all measured requests in flight together, not this request alone",
+    ["route", "overlapped"],
+    buckets=(1 * MB, 2 * MB, 4 * MB, 8 * MB, 16 * MB, 32 * MB, 64 * MB, 128 * MB, 256 * MB, 512 * MB)
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 if text else 0
+
+
+def stage(name: str):
+    """Time a pipeline stage: `with stage("extract"): ...`"""
+    return STAGE_LATENCY.time(stage=name)
+
+
+async def run_in_thread(queue: str, fn, *args, executor: Optional[Executor] = None):
+    """
+    asyncio.to_thread that also records how long the call queued for a pool thread.
+    Pass `executor` to run on a dedicated pool instead of the default one.
+    """
+    submitted = time.perf_counter()
+
+    def run():
+        QUEUE_WAIT.observe(time.perf_counter() - submitted, queue=queue)
+        return fn(*args)
+
+    if executor is None:
+        return await asyncio.to_thread(run)
+    # Like to_thread, carry the trace id over to the worker thread
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, run)
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+_memory_lock = threading.Lock()
+_memory_active: List[Dict] = []
+
+
+@contextmanager
+def track_peak_memory(route: str):
+    """
+    Record the peak heap growth of the enclosed block in request_peak_memory_bytes.
+    Only active while tracemalloc is tracing.
+
+    A value is the highest traced heap during the block minus the heap at its start.
+    tracemalloc keeps a single process-wide peak that can't be split between requests,
+    so a block that overlapped another tracked block is recorded with overlapped="true":
+    its value is the combined peak of everything in flight, an upper bound rather than
+    its own footprint. Only overlapped="false" values are exact per request, and even
+    those include untracked work in the process (batch routes, write-behind flushes).
+    """
+    measurement = {"overlapped": False}
+    if not tracemalloc.is_tracing():
+        yield
+        return
+
+    with _memory_lock:
+        if _memory_active:
+            measurement["overlapped"] = True
+            for other in _memory_active:
+                other["overlapped"] = True
+        else:
+            tracemalloc.reset_peak()
+        _memory_active.append(measurement)
+    start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        with _memory_lock:
+            _memory_active.remove(measurement)
+        overlapped = "true" if measurement["overlapped"] else "false"
+        REQUEST_PEAK_MEMORY.observe(max(0, peak - start), route=route, overlapped=overlapped)
@@ -1,8 +1,8 @@
 # utils/pdf_utils.py
-import fitz  # PyMuPDF
-import pdfplumber
-from io import BytesIO
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+from utils.metrics import PAGES_PROCESSED, run_in_thread
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +14,92 @@ SCANNER_WATERMARKS = {
     'image only', 'no text', 'draft', 'confidential'
 }
 
+SCANNED_PDF_MESSAGE = "Scanned PDFs are not supported. Please upload a text-based PDF."
+EMPTY_PDF_MESSAGE = "Empty PDF: No pages found."
+CORRUPT_PDF_MESSAGE = "Could not extract text from PDF. The file may be corrupted or encrypted."
+
+# PyMuPDF doesn't support multithreading, so every fitz call in the app runs on this one thread
+FITZ_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fitz")
+
+class EmptyPdfError(ValueError):
+    pass
+
+async def run_fitz(fn, *args):
+    """Run a function that touches fitz (extraction, advancing iter_pdf_pages) on the fitz thread."""
+    return await run_in_thread("extract", fn, *args, executor=FITZ_EXECUTOR)
+
+def warm():
+    """Import PyMuPDF ahead of the first upload (it's imported lazily to keep startup fast)."""
+    import fitz  # noqa: F401
+
+class ScannedPdfScreen:
+    """
+    The scanned-PDF checks, fed one page at a time.
+    `accepted` turns True as soon as no later page could make the PDF fail the
+    checks, which lets the streaming pipeline start summarizing before the end.
+    """
+
+    def __init__(self):
+        self.total_chars = 0
+        self.scanner_mentions = 0  # Count of scanner-related words
+        self.has_text = False
+        self.has_real_word = False  # Any word that isn't just a watermark
+
+    def add(self, text: str):
+        # Count meaningful characters
+        cleaned_text = "".join(c for c in text if c.isalnum() or c.isspace())
+        self.total_chars += len(cleaned_text)
+
+        # Count scanner watermarks
+        text_lower = text.lower()
+        for word in SCANNER_WATERMARKS:
+            if word in text_lower:
+                self.scanner_mentions += text_lower.count(word)
+
+        if text.strip():
+            self.has_text = True
+        if not self.has_real_word:
+            self.has_real_word = any(
+                word.lower() not in SCANNER_WATERMARKS for word in text.split() if len(word) > 2
+            )
+
+    @property
+    def accepted(self) -> bool:
+        # Both counters only grow, so past these thresholds verdict() can only pass
+        return self.total_chars >= 200 and self.has_real_word
+
+    def verdict(self) -> Optional[str]:
+        """Rejection message once all pages are in, or None for a valid text-based PDF."""
+        # If no meaningful text was extracted
+        if self.total_chars < 50:
+            return SCANNED_PDF_MESSAGE
+
+        # If scanner watermarks appear more than 3 times and text is minimal
+        if self.scanner_mentions > 3 and self.total_chars < 200:
+            return SCANNED_PDF_MESSAGE
+
+        # If the entire text is just "CamScanner" repeated
+        if self.has_text and not self.has_real_word:
+            return SCANNED_PDF_MESSAGE
+
+        return None
+
+def iter_pdf_pages(content: bytes) -> Iterator[str]:
+    """
+    Yield the stripped text of each page, one page in memory at a time.
+    Raises EmptyPdfError for a PDF with no pages; fitz errors propagate.
+    """
+    import fitz  # PyMuPDF
+
+    # Open once and walk the pages (re-parsing the file per page made big PDFs quadratic)
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        if doc.page_count == 0:
+            raise EmptyPdfError(EMPTY_PDF_MESSAGE)
+
+        PAGES_PROCESSED.inc(doc.page_count)
+        for page in doc:
+            yield page.get_text("text").strip()
+
 def extract_text_from_pdf(content: bytes) -> str:
     """
     Extract text from a PDF.
@@ -21,53 +107,24 @@ def extract_text_from_pdf(content: bytes) -> str:
     - Detects and rejects scanned PDFs
     """
     try:
-        # Validate PDF structure
-        with fitz.open(stream=content, filetype="pdf") as doc:
-            if doc.page_count == 0:
-                return "Empty PDF: No pages found."
-
-        all_text = ""
-        total_chars = 0
-        scanner_mentions = 0  # Count of scanner-related words
-
-        with pdfplumber.open(BytesIO(content)) as pdf:
-            for page_num in range(len(pdf.pages)):
-                # Use fitz for main text extraction
-                doc = fitz.open(stream=content, filetype="pdf")
-                page = doc[page_num]
-                text = page.get_text("text").strip()
-                doc.close()
-
-                # Count meaningful characters
-                cleaned_text = "".join(c for c in text if c.isalnum() or c.isspace())
-                total_chars += len(cleaned_text)
-
-                # Count scanner watermarks
-                text_lower = text.lower()
-                for word in SCANNER_WATERMARKS:
-                    if word in text_lower:
-                        scanner_mentions += text_lower.count(word)
-
-                # Append to full text (for later analysis)
-                if text:
-                    all_text += text + "\n"
+        screen = ScannedPdfScreen()
+        pages = []
+        for text in iter_pdf_pages(content):
+            screen.add(text)
+            # Keep the text (for later analysis)
+            if text:
+                pages.append(text)
 
         # --- Decision Logic ---
-        # If no meaningful text was extracted
-        if total_chars < 50:
-            return "Scanned PDFs are not supported. Please upload a text-based PDF."
-
-        # If scanner watermarks appear more than 3 times and text is minimal
-        if scanner_mentions > 3 and total_chars < 200:
-            return "Scanned PDFs are not supported. Please upload a text-based PDF."
-
-        # If the entire text is just "CamScanner" repeated
-        if all_text.strip() and all(word.lower() in SCANNER_WATERMARKS for word in all_text.split() if len(word) > 2):
-            return "Scanned PDFs are not supported. Please upload a text-based PDF."
+        rejection = screen.verdict()
+        if rejection:
+            return rejection
 
         # ✅ Valid text-based PDF
-        return all_text.strip()
+        return "\n".join(pages).strip()
 
+    except EmptyPdfError:
+        return EMPTY_PDF_MESSAGE
     except Exception as e:
         logger.error(f"Text extraction failed: {e}")
-        return "Could not extract text from PDF. The file may be corrupted or encrypted."
\ No newline at end of file
+        return CORRUPT_PDF_MESSAGE
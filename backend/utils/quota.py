@@ -0,0 +1,306 @@
+# utils/quota.py
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+from limits.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# A window record is (window, start, prev, curr): the window length, the aligned
+# start of the current window, and the hit counts of the previous and current
+# windows. That is all a sliding-window counter needs, so every check is O(1).
+State = Tuple[int, int, int, int]
+
+
+def _roll(state: Optional[State], window: int, now: float) -> State:
+    """Advance a record to the window containing `now`."""
+    current = int(now // window) * window
+    if state is None or state[0] != window:
+        return window, current, 0, 0
+    _, start, prev, curr = state
+    if current == start:
+        return state
+    if current - start == window:
+        return window, current, curr, 0
+    return window, current, 0, 0
+
+
+def _estimate(state: State, now: float) -> float:
+    """Sliding-window estimate: the previous window weighted by how much of it still overlaps."""
+    window, start, prev, curr = state
+    overlap = (window - (now - start)) / window
+    return prev * overlap + curr
+
+
+class QuotaUnavailableError(RuntimeError):
+    """The shared store couldn't be locked in time (too many workers writing at once)."""
+
+
+class QuotaStore:
+    """
+    Sliding-window quota counters.
+
+    Backends only implement `_update` (an atomic read-modify-write of one
+    record), `_read`, `_delete` and `_sweep`; the window arithmetic is shared.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+
+    # --- backend hooks ---
+    def _update(self, key: str, fn: Callable[[Optional[State]], Tuple[Optional[State], object]]):
+        raise NotImplementedError
+
+    def _read(self, key: str) -> Optional[State]:
+        raise NotImplementedError
+
+    def _delete(self, key: Optional[str]):
+        raise NotImplementedError
+
+    def _sweep(self, now: float) -> int:
+        raise NotImplementedError
+
+    # --- public API ---
+    def acquire(self, key: str, limit: int, window: int, cost: int = 1) -> Optional[int]:
+        """
+        Atomically check the sliding-window limit and count the hit if allowed.
+        Returns the start of the window the hit was counted in (pass it to `refund`), or None if denied.
+        """
+        now = time.time()
+        self._maybe_sweep(now)
+
+        def fn(state):
+            state = _roll(state, window, now)
+            if _estimate(state, now) + cost > limit:
+                return state, None
+            window_, start, prev, curr = state
+            return (window_, start, prev, curr + cost), start
+
+        return self._update(key, fn)
+
+    def refund(self, key: str, window: int, cost: int = 1, start: Optional[int] = None):
+        """
+        Give back a hit taken by `acquire` (e.g. when the request failed).
+        `start` is what `acquire` returned: if the window has rolled since, the hit is
+        taken out of the previous window, and if it's older than that there's nothing left to refund.
+        """
+        now = time.time()
+
+        def fn(state):
+            state = _roll(state, window, now)
+            window_, current, prev, curr = state
+            if start is None or start == current:
+                return (window_, current, prev, max(0, curr - cost)), None
+            if start == current - window:
+                return (window_, current, max(0, prev - cost), curr), None
+            return state, None
+
+        self._update(key, fn)
+
+    def incr(self, key: str, window: int, cost: int = 1) -> int:
+        """Fixed-window counter, used by the slowapi/limits storage adapter."""
+        now = time.time()
+        self._maybe_sweep(now)
+
+        def fn(state):
+            window_, start, prev, curr = _roll(state, window, now)
+            return (window_, start, prev, curr + cost), curr + cost
+
+        return self._update(key, fn)
+
+    def get(self, key: str) -> int:
+        state = self._read(key)
+        if state is None:
+            return 0
+        return _roll(state, state[0], time.time())[3]
+
+    def get_expiry(self, key: str) -> float:
+        state = self._read(key)
+        if state is None:
+            return time.time()
+        window, start, _, _ = _roll(state, state[0], time.time())
+        return start + window
+
+    def clear(self, key: Optional[str] = None):
+        self._delete(key)
+
+    def _maybe_sweep(self, now: float):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        removed = self._sweep(now)
+        if removed:
+            logger.info(f"🧹 Quota sweep removed {removed} expired entries")
+
+
+class MemoryQuotaStore(QuotaStore):
+    """Per-process store. Fine for a single worker."""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        super().__init__(sweep_interval)
+        self._data: Dict[str, State] = {}
+        self._lock = threading.Lock()
+
+    def _update(self, key, fn):
+        with self._lock:
+            state, result = fn(self._data.get(key))
+            self._data[key] = state
+            return result
+
+    def _read(self, key):
+        return self._data.get(key)
+
+    def _delete(self, key):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def _sweep(self, now):
+        with self._lock:
+            # A record is dead once both of its windows are in the past
+            expired = [k for k, (window, start, _, _) in self._data.items() if start + 2 * window <= now]
+            for k in expired:
+                del self._data[k]
+        return len(expired)
+
+
+class SQLiteQuotaStore(QuotaStore):
+    """
+    Store shared by every worker on the box through one SQLite file.
+    Put the file on tmpfs (/dev/shm, the default) to keep it in shared memory.
+    """
+
+    def __init__(self, path: str, sweep_interval: float = 60.0, busy_timeout: float = 0.25):
+        super().__init__(sweep_interval)
+        self.path = path
+        self._lock = threading.Lock()
+        # Callers run on the event loop and SQLite's busy handler sleeps in C, so don't wait long
+        # for another worker's write lock: give up with QuotaUnavailableError instead
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota ("
+            " key TEXT PRIMARY KEY, window INTEGER NOT NULL, start INTEGER NOT NULL,"
+            " prev INTEGER NOT NULL, curr INTEGER NOT NULL, expires INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS quota_expires ON quota (expires)")
+
+    def _update(self, key, fn):
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so the check and the
+            # increment are atomic across processes
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                raise QuotaUnavailableError(f"quota store busy: {e}") from e
+            try:
+                row = self._conn.execute(
+                    "SELECT window, start, prev, curr FROM quota WHERE key = ?", (key,)
+                ).fetchone()
+                state, result = fn(tuple(row) if row else None)
+                window, start, prev, curr = state
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO quota VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, window, start, prev, curr, start + 2 * window)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def _read(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT window, start, prev, curr FROM quota WHERE key = ?", (key,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def _delete(self, key):
+        with self._lock:
+            if key is None:
+                self._conn.execute("DELETE FROM quota")
+            else:
+                self._conn.execute("DELETE FROM quota WHERE key = ?", (key,))
+
+    def _sweep(self, now):
+        with self._lock:
+            try:
+                return self._conn.execute("DELETE FROM quota WHERE expires <= ?", (now,)).rowcount
+            except sqlite3.OperationalError as e:
+                # Best effort: another worker holds the lock, the next sweep will catch up
+                logger.warning(f"Quota sweep skipped: {e}")
+                return 0
+
+
+def _default_db_path() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "pdepth-quota.sqlite3")
+
+
+_store: Optional[QuotaStore] = None
+
+
+def get_quota_store() -> QuotaStore:
+    """
+    Process-wide quota store, selected by QUOTA_BACKEND:
+    - "memory" (default): per-process dict
+    - "sqlite": shared file at QUOTA_DB_PATH, for running several uvicorn workers
+    """
+    global _store
+    if _store is None:
+        backend = os.getenv("QUOTA_BACKEND", "memory").lower()
+        if backend == "sqlite":
+            path = os.getenv("QUOTA_DB_PATH", _default_db_path())
+            logger.info(f"Using SQLite quota store at {path}")
+            _store = SQLiteQuotaStore(path, busy_timeout=float(os.getenv("QUOTA_BUSY_TIMEOUT", "0.25")))
+        elif backend == "memory":
+            _store = MemoryQuotaStore()
+        else:
+            raise ValueError(f"Unknown QUOTA_BACKEND: {backend}")
+    return _store
+
+
+class QuotaLimitsStorage(Storage):
+    """
+    `limits` storage backed by the quota store, so slowapi's per-route limits
+    share counters (and workers) with the upload quota.
+    Use it with Limiter(storage_uri="quota://").
+    """
+
+    STORAGE_SCHEME = ["quota"]
+
+    def __init__(self, uri: Optional[str] = None, **options):
+        super().__init__(uri, **options)
+        self.store = get_quota_store()
+
+    @property
+    def base_exceptions(self):
+        return (sqlite3.Error, QuotaUnavailableError)
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        return self.store.incr(key, int(expiry), amount)
+
+    def get(self, key: str) -> int:
+        return self.store.get(key)
+
+    def get_expiry(self, key: str) -> float:
+        return self.store.get_expiry(key)
+
+    def check(self) -> bool:
+        return True
+
+    def reset(self):
+        self.store.clear()
+
+    def clear(self, key: str):
+        self.store.clear(key)
@@ -0,0 +1,71 @@
+# utils/singleflight.py
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from utils.metrics import COALESCED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(namespace: str, data) -> Tuple[str, str]:
+    """Build a coalescing key from a namespace and the request payload (str or bytes)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return namespace, hashlib.sha256(data).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one shared in-flight task.
+
+    The first caller for a key starts the work; everyone arriving while it is
+    still running awaits the same task. Callers are shielded from each other:
+    a cancelled caller (e.g. a client that disconnected) only detaches itself,
+    and the shared task is cancelled only once no caller is left waiting.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[str, str], int] = {}
+
+    async def do(self, key: Tuple[str, str], fn: Callable[[], Awaitable[Any]]) -> Any:
+        namespace = key[0]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+            COALESCED_REQUESTS.inc(route=namespace, role="executed")
+        else:
+            COALESCED_REQUESTS.inc(route=namespace, role="coalesced")
+            logger.info(f"🔗 Coalesced {namespace} request onto in-flight work ({key[1][:12]})")
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1:
+                logger.info(f"🛑 Last waiter left, cancelling shared {namespace} work ({key[1][:12]})")
+                # Forget the key first so a request arriving before the task finishes
+                # cancelling starts fresh work instead of joining a dying task
+                del self._inflight[key]
+                del self._waiters[key]
+                task.cancel()
+            raise
+        finally:
+            if key in self._waiters and self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: Tuple[str, str], task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # Retrieve the exception so a result nobody awaited doesn't log "never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def inflight(self) -> int:
+        return len(self._inflight)
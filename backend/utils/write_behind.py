@@ -0,0 +1,311 @@
+# utils/write_behind.py
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_RECORDS = Counter(
+    "write_behind_records_total",
+    "Records handled by the Supabase write-behind queue (flushed, merged into a later duplicate, spilled to disk, failed permanently)",
+    ["table", "outcome"]
+)
+
+
+class WriteBehindQueue:
+    """
+    Buffers rows in memory and upserts them to Supabase (PostgREST) in batches
+    from a background task, so request handlers never wait on the database.
+
+    - Flushes when `batch_size` rows are waiting or every `flush_interval` seconds.
+    - Failed batches are retried with exponential backoff.
+    - The buffer holds at most `max_buffer` rows; beyond that rows are set aside
+      and the background task spills them in batches to a JSONL file in
+      `spill_dir`, to be replayed once the buffer drains.
+    - Rows Supabase rejects outright (4xx) go to a dead-letter file instead of
+      being retried forever.
+
+    Each process holds an exclusive lock on `spill-<pid>.lock` while it runs, so
+    another worker only replays its spill file once the owner has stopped or
+    crashed and can no longer be appending to it.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str],
+        key: Optional[str],
+        conflict_columns: Optional[Dict[str, str]] = None,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        max_buffer: int = 10000,
+        max_backoff: float = 60.0,
+        spill_dir: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url.rstrip("/") if url else None
+        self.key = key
+        self.conflict_columns = conflict_columns or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_backoff = max_backoff
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), "pdepth-write-behind")
+        self.spill_path = os.path.join(self.spill_dir, f"spill-{os.getpid()}.jsonl")
+        self.dead_letter_path = os.path.join(self.spill_dir, f"dead-letter-{os.getpid()}.jsonl")
+        self.lock_path = os.path.join(self.spill_dir, f"spill-{os.getpid()}.lock")
+        self._transport = transport
+        self._buffer: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._overflow: List[Tuple[str, Dict[str, Any]]] = []  # Waiting to be spilled
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._failures = 0
+        self._spilled = False
+        self._lock_fd: Optional[int] = None
+        self._file_lock = threading.Lock()  # Spill writes (in threads) vs. claiming our own file
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url and self.key)
+
+    def pending(self) -> int:
+        return len(self._buffer) + len(self._overflow)
+
+    def enqueue(self, table: str, record: Dict[str, Any]):
+        """Queue one row for upsert. Never blocks on the network or the disk."""
+        if not self.enabled:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            # Spilling is left to the background task, so a request never writes the file itself
+            self._overflow.append((table, record))
+            if len(self._overflow) >= self.batch_size:
+                self._wakeup.set()
+            return
+        self._buffer.append((table, record))
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        if not self.enabled:
+            logger.info("Supabase not configured; write-behind persistence is off")
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        self._client = httpx.AsyncClient(
+            base_url=f"{self.url}/rest/v1",
+            headers={
+                "apikey": self.key,
+                "Authorization": f"Bearer {self.key}",
+                "Content-Type": "application/json",
+                "Prefer": "resolution=merge-duplicates,return=minimal",
+            },
+            timeout=15.0,
+            transport=self._transport,
+        )
+        # Pick up rows spilled by earlier processes, or left mid-replay by a crashed one
+        self._spilled = bool(glob.glob(os.path.join(self.spill_dir, "spill-*.jsonl*")))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush what we can before shutdown; whatever is left is spilled to disk."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except Exception as e:
+            logger.warning(f"💾 Final flush incomplete: {e}")
+        await self._spill_overflow()
+        if self._buffer:
+            rows = list(self._buffer)
+            self._buffer.clear()
+            await asyncio.to_thread(self._spill, rows)
+        await self._client.aclose()
+        self._task = None
+        # Releasing the lock hands whatever we spilled over to the other workers
+        os.remove(self.lock_path)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._spill_overflow()
+            try:
+                await self._drain()
+            except Exception as e:
+                self._failures += 1
+                delay = min(self.max_backoff, self.flush_interval * 2 ** self._failures) * random.uniform(0.5, 1.0)
+                logger.warning(f"💾 Supabase flush failed ({e}); retrying in {delay:.1f}s")
+                await self._backoff(delay)
+
+    async def _backoff(self, delay: float):
+        """Wait before retrying, still spilling overflow every flush_interval meanwhile."""
+        deadline = asyncio.get_running_loop().time() + delay
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, self.flush_interval))
+            await self._spill_overflow()
+
+    async def _spill_overflow(self):
+        if not self._overflow:
+            return
+        rows, self._overflow = self._overflow, []
+        await asyncio.to_thread(self._spill, rows)
+
+    async def _drain(self):
+        while self._buffer:
+            await self.flush()
+        if self._spilled:
+            await self._replay_spill()
+            while self._buffer:
+                await self.flush()
+
+    async def flush(self):
+        """Upsert up to `batch_size` buffered rows, one request per table."""
+        batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        by_table: Dict[str, List[Dict[str, Any]]] = {}
+        for table, record in batch:
+            by_table.setdefault(table, []).append(record)
+
+        done: List[str] = []
+        try:
+            for table, rows in by_table.items():
+                await self._upsert(table, self._collapse(table, rows))
+                done.append(table)
+        except BaseException:
+            # Put back everything that didn't make it, in order, for the retry
+            retry = [(t, r) for t, r in batch if t not in done]
+            self._buffer.extendleft(reversed(retry))
+            raise
+        self._failures = 0
+
+    def _collapse(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Keep one row per conflict key, the last one queued: Postgres rejects a bulk upsert
+        that touches the same row twice (e.g. many uploads of the same PDF in one flush).
+        """
+        if table not in self.conflict_columns:
+            return rows
+        columns = self.conflict_columns[table].split(",")
+        latest: Dict[Tuple, Dict[str, Any]] = {}
+        for row in rows:
+            latest[tuple(row.get(c) for c in columns)] = row
+        if len(latest) < len(rows):
+            WRITE_BEHIND_RECORDS.inc(len(rows) - len(latest), table=table, outcome="merged")
+        return list(latest.values())
+
+    async def _upsert(self, table: str, rows: List[Dict[str, Any]]):
+        params = {}
+        if table in self.conflict_columns:
+            params["on_conflict"] = self.conflict_columns[table]
+        response = await self._client.post(f"/{table}", params=params, json=rows)
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            response.raise_for_status()
+        if response.status_code >= 400:
+            # Retrying won't fix a schema/permission error: park the rows for inspection
+            logger.error(f"💾 Supabase rejected {len(rows)} rows for {table}: {response.status_code} {response.text[:200]}")
+            await asyncio.to_thread(self._write_lines, self.dead_letter_path, [(table, r) for r in rows])
+            WRITE_BEHIND_RECORDS.inc(len(rows), table=table, outcome="failed")
+            return
+        WRITE_BEHIND_RECORDS.inc(len(rows), table=table, outcome="flushed")
+
+    def _spill(self, rows: List[Tuple[str, Dict[str, Any]]]):
+        self._write_lines(self.spill_path, rows)
+        self._spilled = True
+        for table, _ in rows:
+            WRITE_BEHIND_RECORDS.inc(table=table, outcome="spilled")
+
+    def _write_lines(self, path: str, rows: List[Tuple[str, Dict[str, Any]]]):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with self._file_lock, open(path, "a") as f:
+            for table, record in rows:
+                f.write(json.dumps({"table": table, "record": record}, default=str) + "\n")
+
+    def _owner_running(self, pid: int) -> bool:
+        """Whether the process that wrote (or was replaying) a spill file still holds its lock."""
+        if pid == os.getpid():
+            return False
+        try:
+            fd = os.open(os.path.join(self.spill_dir, f"spill-{pid}.lock"), os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)  # Also drops the lock if we just took it
+        return False
+
+    def _claim_spills(self) -> List[str]:
+        """
+        Rename every replayable spill file to `<name>.replaying-<our pid>`: our own file,
+        files of workers that are gone, and files a crashed worker had claimed but not finished.
+        """
+        claimed = []
+        for path in glob.glob(os.path.join(self.spill_dir, "spill-*.jsonl*")):
+            name, _, claimer = os.path.basename(path).partition(".replaying-")
+            try:
+                pid = int(claimer or name[len("spill-"):-len(".jsonl")])
+            except ValueError:
+                continue
+            if self._owner_running(pid):
+                continue
+            target = os.path.join(self.spill_dir, f"{name}.replaying-{os.getpid()}")
+            try:
+                with self._file_lock:
+                    os.rename(path, target)
+            except OSError:
+                continue  # Another worker claimed it first
+            claimed.append(target)
+        return claimed
+
+    def _read_spills(self) -> List[Tuple[str, Dict[str, Any]]]:
+        rows = []
+        for path in self._claim_spills():
+            skipped = 0
+            with open(path) as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        skipped += 1  # Torn last line of a process killed mid-write
+                        continue
+                    rows.append((item["table"], item["record"]))
+            os.remove(path)
+            logger.info(f"💾 Replaying spilled rows from {os.path.basename(path)}"
+                        + (f" ({skipped} unreadable lines skipped)" if skipped else ""))
+        return rows
+
+    async def _replay_spill(self):
+        """Move spilled rows back into the buffer, as many as fit."""
+        self._spilled = False
+        rows = await asyncio.to_thread(self._read_spills)
+        room = max(0, self.max_buffer - len(self._buffer))
+        self._buffer.extend(rows[:room])
+        if rows[room:]:
+            await asyncio.to_thread(self._spill, rows[room:])
@@ -3,17 +3,21 @@ import httpx
 import os
 import re
 from collections import Counter
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
+import logging
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # YouTube API Config
+# Missing key only disables video lookups; it must not stop the app from starting
 API_KEY = os.getenv("YOUTUBE_API_KEY")
 if not API_KEY:
-    raise ValueError("YOUTUBE_API_KEY not set in environment")
+    logger.warning("YOUTUBE_API_KEY not set; video recommendations are disabled")
 
-BASE_URL = "https://www.googleapis.com/youtube/v3/search"  # ✅ Fixed: no trailing spaces
+BASE_URL = os.getenv("YOUTUBE_BASE_URL", "https://www.googleapis.com/youtube/v3/search")
 
 # Stopwords for keyword extraction
 STOPWORDS = set("""
@@ -77,26 +81,33 @@ def extract_keywords(text: str, k: int = 6) -> list:
 
     return keywords
 
-def recommend_videos_from_summary(summary: str) -> List[Dict[str, Any]]:
+def build_search_query(summary: str) -> Optional[str]:
     """
-    Recommend YouTube videos using smart keyword extraction.
-    Returns empty list if summary is invalid.
+    YouTube search query for a summary, or None if the summary is too short to use.
+    Summaries that share keywords map to the same query, so batches can dedupe lookups.
     """
     if not summary or len(summary.strip()) < 50:
-        return []
+        return None
 
-    try:
-        # Extract keywords
-        keywords = extract_keywords(summary, k=6)
+    # Extract keywords
+    keywords = extract_keywords(summary, k=6)
 
-        # Build query: use keywords, but ensure it's meaningful
-        if keywords:
-            query = " ".join(keywords)
-        else:
-            query = "lecture introduction overview"
+    # Build query: use keywords, but ensure it's meaningful
+    if keywords:
+        query = " ".join(keywords)
+    else:
+        query = "lecture introduction overview"
 
-        search_query = f"{query} tutorial"
+    return f"{query} tutorial"
 
+def search_videos(search_query: str) -> List[Dict[str, Any]]:
+    """
+    Run one YouTube search and return up to 6 parsed videos.
+    Returns empty list if the search fails.
+    """
+    if not API_KEY:
+        return []
+    try:
         # YouTube API request
         params = {
             "part": "snippet",
@@ -143,4 +154,18 @@ def recommend_videos_from_summary(summary: str) -> List[Dict[str, Any]]:
 
     except Exception as e:
         print(f"YouTube search failed: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def recommend_videos_from_summary(summary: str) -> List[Dict[str, Any]]:
+    """
+    Recommend YouTube videos using smart keyword extraction.
+    Returns empty list if summary is invalid.
+    """
+    try:
+        search_query = build_search_query(summary)
+    except Exception as e:
+        logger.warning(f"Keyword extraction for video search failed: {e}")
+        return []
+    if search_query is None:
+        return []
+    return search_videos(search_query)